@@ -1,15 +1,20 @@
 """Console script for sked_parser."""
 
 import argparse
+import json
 import logging
 import os
 import sys
+from contextlib import contextmanager
+from importlib import resources
 from pathlib import Path
 
-import pkg_resources
 import yaml
 
-from sked_parser import app
+# Only import lightweight modules here, app and scraper pull in requests, bs4 and lxml and are imported once the
+# arguments are parsed and the configuration is loaded. This keeps `--help` and invalid invocations fast.
+from sked_parser import output
+from sked_parser.cache import default_cache_dir
 
 log = logging.getLogger("sked_parser")
 
@@ -20,6 +25,44 @@ def load_yaml_conf(yaml_file):
         return yaml.safe_load(stream)
 
 
+def load_batch(batch_file):
+    """Load the jobs of a batch file as (config, out_files) pairs. Relative paths are relative to the batch file."""
+    jobs = []
+    for job in load_yaml_conf(batch_file)["jobs"]:
+        out_files = job["out_files"]
+        if isinstance(out_files, str):
+            out_files = [out_files]
+        config = load_yaml_conf(batch_file.parent / job["config"])
+        jobs.append((config, [(batch_file.parent / out_file).resolve() for out_file in out_files]))
+    return jobs
+
+
+@contextmanager
+def profiled(profiler, profile_file):
+    """Context manager that profiles its body with `profiler` and stores the result in `profile_file`"""
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            profile_file.write_text(profile.output_html())
+    else:
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(profile_file)
+    log.info(f"Stored profile in {profile_file}")
+
+
 def main():
     # Add helpful logging handler
     log.setLevel(logging.DEBUG)
@@ -54,12 +97,139 @@ def main():
         action="append",
         help="Where to store the resulting json file. Can be specified multiple times.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always download the overview pages instead of using the on-disk HTTP cache",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=str(default_cache_dir()),
+        help="Directory of the on-disk HTTP cache",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=600,
+        help="Seconds in which cached overview pages are used without revalidating them with the server",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=int,
+        default=100,
+        help="Maximum size of the HTTP cache in MiB",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only parse overview pages that changed since the last incremental run and reuse the previous entries "
+        "of all others. The state is stored next to the first output file.",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write the JSON output without indentation",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=sorted(output.writers),
+        help="Output format for all output files. By default it's selected by the file extension "
+        "(.ndjson/.jsonl for newline delimited JSON, .msgpack for msgpack) and falls back to JSON.",
+    )
+    parser.add_argument(
+        "--changelog",
+        type=str,
+        help="Write the added, removed and modified timetables compared to the previous output to this JSON file. "
+        "It's only written if something changed.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running, poll the overview pages regularly with conditional requests and only rewrite the "
+        "output files when the resulting timetables change",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=300,
+        help="Seconds between two polls of the same overview page in watch mode",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.1,
+        help="Maximum random deviation of the poll interval in watch mode, as a fraction of the interval",
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        help="Path to a yaml file with a list of `jobs`, each with a `config` file and its `out_files`. All jobs are "
+        "scraped together, shared overview pages are fetched only once and parsed in a process pool. "
+        "Relative paths are resolved against the directory of the batch file.",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="Number of worker processes for parsing in batch mode. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        metavar="DIR",
+        help="Store every downloaded overview page gzip compressed in DIR along with a manifest, for --replay. Bypasses the HTTP cache.",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        metavar="DIR",
+        help="Serve all overview pages from a directory recorded with --record instead of the network. No credentials are needed.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        help="Write the timings and counters of the run to this file",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        type=str,
+        choices=["json", "prometheus"],
+        default="json",
+        help="Format of the metrics file",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        choices=["cprofile", "pyinstrument"],
+        help="Profile the run with cProfile or pyinstrument (needs to be installed). "
+        "The overview pages are then processed in the main thread, so the profile covers everything.",
+    )
+    parser.add_argument(
+        "--profile-file",
+        type=str,
+        default="sked_parser.prof",
+        help="Where to store the profile. cProfile writes pstats data, pyinstrument an HTML report.",
+    )
     args = parser.parse_args()
+    if args.batch is not None and (args.watch or args.incremental or args.profile or args.changelog is not None):
+        parser.error("--batch can't be combined with --watch, --incremental, --profile or --changelog")
+    if args.replay is not None and (args.record is not None or args.watch):
+        parser.error("--replay can't be combined with --record or --watch")
+    if args.batch is not None and args.metrics_format != "json":
+        parser.error("--batch only supports json metrics")
 
     # Config contains the urls and other configuration.
-    if args.config_file is None:
+    if args.batch is not None:
+        jobs = load_batch(Path(args.batch).resolve())
+        # All jobs share one session, so their transport settings have to agree
+        http_settings = [job_config.get("http") or {} for job_config, _ in jobs]
+        if any(http != http_settings[0] for http in http_settings):
+            parser.error("The jobs of --batch have different http settings")
+        config = {"workers": max(job_config.get("workers", 4) for job_config, _ in jobs), "http": http_settings[0]}
+    elif args.config_file is None:
         # If file is not specified, use the package-provided config file
-        config = yaml.safe_load(pkg_resources.resource_string(__name__, "config.yaml"))
+        config = yaml.safe_load(resources.files("sked_parser").joinpath("config.yaml").read_bytes())
     else:
         # Load from the specified file
         config = load_yaml_conf(Path(args.config_file).resolve())
@@ -73,7 +243,10 @@ def main():
         secrets = load_yaml_conf(secrets_path)
         secrets["user"] = secrets["sked"]["user"]
         secrets["pass"] = secrets["sked"]["pass"]
-    if secrets["user"] is None or secrets["pass"] is None:
+    if args.replay is not None:
+        # The recorded pages are served without any request to ostfalia
+        secrets = None
+    elif secrets["user"] is None or secrets["pass"] is None:
         raise Exception("Please specify your Ostalia credentials either via a secrets.yaml file or via environment variables.")
 
     #
@@ -81,7 +254,46 @@ def main():
         out_files = [Path("timetables.json").resolve()]
     else:
         out_files = [Path(x).resolve() for x in args.out_file]
-    app.main(config, secrets, out_files)
+
+    from sked_parser import app, scraper, snapshot
+
+    # Set up connection pools, retries, timeouts and the credentials once for all requests
+    scraper.configure_session(secrets, pool_maxsize=config.get("workers", 4), **(config.get("http") or {}))
+    recording = None
+    if args.record is not None:
+        recording = snapshot.record(scraper.session, Path(args.record).resolve())
+    elif args.replay is not None:
+        snapshot.replay(scraper.session, Path(args.replay).resolve())
+        # Without network I/O there is nothing to pace
+        for run_config in [job_config for job_config, _ in jobs] if args.batch is not None else [config]:
+            run_config["requests_per_second"] = 0
+    elif not args.no_cache:
+        # In watch mode every poll has to ask the server, which is cheap thanks to the conditional requests
+        cache_ttl = 0 if args.watch else args.cache_ttl
+        scraper.install_cache(Path(args.cache_dir), cache_ttl, args.cache_max_size * 1024 * 1024)
+    try:
+        if args.batch is not None:
+            batch_metrics = app.run_batch(jobs, secrets, args.processes, args.compact, args.format)
+            if args.metrics_file is not None:
+                with open(Path(args.metrics_file).resolve(), "w") as f:
+                    json.dump([metrics.to_dict() for metrics in batch_metrics], f, indent=2, ensure_ascii=False)
+            return
+        if args.watch:
+            app.watch(config, secrets, out_files, args.interval, args.jitter, args.compact, args.format)
+            return
+        changelog = Path(args.changelog).resolve() if args.changelog is not None else None
+        if args.profile is not None:
+            config["workers"] = 1
+            with profiled(args.profile, Path(args.profile_file).resolve()):
+                metrics = app.main(config, secrets, out_files, args.incremental, args.compact, args.format, changelog)
+        else:
+            metrics = app.main(config, secrets, out_files, args.incremental, args.compact, args.format, changelog)
+        if args.metrics_file is not None:
+            with open(Path(args.metrics_file).resolve(), "w") as f:
+                f.write(metrics.to_prometheus() if args.metrics_format == "prometheus" else metrics.to_json())
+    finally:
+        if recording is not None:
+            recording.save()
 
 
 if __name__ == "__main__":
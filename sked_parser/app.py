@@ -1,103 +1,493 @@
+import hashlib
 import json
 import logging
-from time import sleep
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from operator import attrgetter
+from pathlib import Path
+from time import monotonic, perf_counter, sleep
 
-from sked_parser import scraper
+import requests
+
+from sked_parser import output, scraper
+from sked_parser.filters import BUILTIN_EXCLUSIONS, TimetableFilter
+from sked_parser.metrics import PlanMetrics, RunMetrics
+from sked_parser.normalize import ID_RULES, LABEL_CLEANUP_RULES, LABEL_RULES, RuleSet
+from sked_parser.timetable import Timetable
 
 log = logging.getLogger("sked_parser")
 
+# Version of the entries in the incremental state. Bump it whenever a change of the code that builds the entries
+# (e.g. `extract_semester` or an extractor) changes the IDs or labels, so the stored entries are rebuilt.
+STATE_VERSION = 1
 
-def write_timetable_json(tables, file_path):
-    with open(file_path, "w") as f:
-        json.dump(tables, f, indent=2, ensure_ascii=False)
-        f.write("\n")
 
+def deduplicate_tables(tables, sources=None):
+    """Remove duplicated timetables and report duplicated IDs in a single pass over `tables`.
 
-def raise_for_duplicated_ids(dict_to_check):
-    """Helper function that prints an error if key `id` of that dict list has duplicated values.
-    Also raises if dict key 'id' does not exist."""
-    ids = [item["id"] for item in dict_to_check]
-    duplicated_ids = set([x for x in ids if ids.count(x) > 1])
-    if len(duplicated_ids) > 0:
-        log.critical(f"Zwei oder mehr Pläne haben die gleiche ID bekommen: {duplicated_ids}")
+    Entries with an already seen URL/timetablePath are removed, we always just use the first one.
+    Afterwards an error is logged for every ID that is still used by more than one timetable.
 
+    Args:
+        tables (List[Timetable]): Timetable entries, usually already sorted
+        sources (dict): Maps each timetablePath to the list of overview URLs it was scraped from. Used for the report.
 
-def remove_duplicated_urls(dict_to_check):
-    """Remove all timetables entries that have a duplicated URL/timetablePath. We always just use the first one."""
-    unique_urls = []
-    for item in dict_to_check:
-        if item["timetablePath"] in unique_urls:
-            dict_to_check.remove(item)
-        else:
-            unique_urls.append(item["timetablePath"])
+    Returns:
+        Tuple[List[Timetable], Dict[str, List[str]]]: The remaining entries and all colliding IDs with the sources
+            of the plans that got that ID
+    """
+    sources = sources or {}
+    seen_urls = set()
+    unique_tables = []
+    tables_by_id = {}
+    for table in tables:
+        if table.timetable_path in seen_urls:
+            continue
+        seen_urls.add(table.timetable_path)
+        unique_tables.append(table)
+        tables_by_id.setdefault(table.id, []).append(table)
+    collisions = {
+        sked_id: [", ".join(sources.get(table.timetable_path, [table.timetable_path])) for table in colliding]
+        for sked_id, colliding in tables_by_id.items()
+        if len(colliding) > 1
+    }
+    for sked_id, colliding_sources in collisions.items():
+        log.critical(f"Zwei oder mehr Pläne haben die gleiche ID {sked_id} bekommen, Quellen: {colliding_sources}")
+    return unique_tables, collisions
 
 
 def is_valid_item(table, blacklist):
-    """Returns whether a table is allowed in spluseins. Used for filtering some unwanted items (Klausurenpläne)"""
-    if table["faculty"] == "Elektrotechnik" and "block" in table["timetablePath"].lower():
-        # Blockveranstaltungen (Fakultät E) erstmal raus
-        return False
-    if table["faculty"] == "Soziale Arbeit" and "fernstudiengang" in table["label"].lower():
-        # schlechte formatierung, wird ignoriert
-        return False
-    for forbidden in blacklist:
-        if forbidden.lower() in table["timetablePath"].lower():
-            log.info("Skipping timetable with forbidden path: " + table["timetablePath"])
-            return False
-        if forbidden.lower() in table["label"].lower():
-            log.info("Skipping timetable with forbidden label: " + table["label"])
-            return False
-    return True
-
-
-def main(config, secrets, out_files):
+    """Returns whether a table is allowed in spluseins. Used for filtering some unwanted items (Klausurenpläne).
+    Compiles the `blacklist` on every call, use a `TimetableFilter` for checking many tables."""
+    return log_exclusion(table, TimetableFilter.from_config({"timetable_blacklist": blacklist}).match(table))
+
+
+def log_exclusion(table, match):
+    """Log why `table` is excluded if `match` is a result of `TimetableFilter.match`. Returns whether it's allowed."""
+    if match is None:
+        return True
+    rule, field = match
+    if rule in BUILTIN_EXCLUSIONS:
+        log.debug(f"Skipping timetable {table.timetable_path}: {rule.reason}")
+    else:
+        value = table.timetable_path if field == "path" else table.label
+        log.info(f"Skipping timetable with forbidden {field}: {value} (rule {rule.pattern!r})")
+    return False
+
+
+def plan_key(plan):
+    """Key under which the state of `plan` is stored for incremental runs"""
+    return f"{plan['faculty']} {plan['url']}"
+
+
+def plan_digest(plan, current_sem):
+    """Return a hash object that is initialized with the config of a plan. The overview page is added afterwards.
+    It also covers `STATE_VERSION` and the built-in normalization rules, so an upgrade invalidates the stored entries."""
+    builtin_rules = [rules.rules for rules in (ID_RULES, LABEL_RULES, LABEL_CLEANUP_RULES)]
+    return hashlib.sha256(json.dumps([STATE_VERSION, builtin_rules, plan, current_sem], sort_keys=True).encode())
+
+
+def state_file_for(out_file):
+    """Return the path of the incremental state file that belongs to `out_file`"""
+    return Path(out_file).with_suffix(".state.json")
+
+
+def load_state(state_file):
+    """Load the per-plan fingerprints and entries of the last incremental run. Returns an empty state if there is none."""
+    try:
+        with open(state_file, "r") as f:
+            state = json.load(f)
+        for plan_state in state["plans"].values():
+            plan_state["tables"] = [Timetable.from_dict(table) for table in plan_state["tables"]]
+        return state
+    except (OSError, ValueError, KeyError):
+        return {"plans": {}}
+
+
+def write_state(state, state_file):
+    """Write the state atomically, so a crash while writing never leaves a truncated state file behind."""
+    output.write_file(json.dumps(state, ensure_ascii=False, default=Timetable.to_dict).encode("utf-8"), state_file)
+
+
+def parse_plan(plan, secrets, current_sem, previous=None, engine="bs4", plan_metrics=None, metrics=None):
+    """Scrape a single overview page of `plan`.
+
+    Args:
+        plan (dict): Plan entry of the config
+        secrets (dict): Dict containing `user` and `pass` to access the ostfalia timetable module
+        current_sem (str): Current semester string that is appended to the IDs
+        previous (dict): State of this plan from the last run with `fingerprint` and `tables`. If the fingerprint still
+            matches, its entries are reused instead of parsing the page again. Defaults to None.
+        engine (str): HTML engine for extracting the links, see `scraper.parse_links`. Defaults to "bs4".
+        plan_metrics (PlanMetrics): Receives the fetch and parse timings of this plan. Defaults to None.
+        metrics (RunMetrics): Receives the cumulative time spent in the helpers. Defaults to None.
+
+    Returns:
+        Tuple[str, List[dict]]: The fingerprint of the plan and its timetable entries in the order they were found
+    """
+    plan_metrics = plan_metrics or PlanMetrics(plan["url"], plan["faculty"])
+    digest = plan_digest(plan, current_sem)
+    chunks = _measured(scraper.fetch_chunks(plan["url"], secrets), digest, plan_metrics)
+    if engine == "stream":
+        # The page is parsed while it's downloaded, so the fingerprint is only known afterwards
+        start = perf_counter()
+        tuples = set(scraper.iter_links(chunks, plan["url"], plan["faculty"], plan.get("extractor")))
+        plan_metrics.parse_seconds = perf_counter() - start - plan_metrics.fetch_seconds
+    else:
+        content = b"".join(chunks)
+        tuples = None
+    fingerprint = digest.hexdigest()
+    if previous is not None and previous.get("fingerprint") == fingerprint:
+        log.debug(f"URL {plan['url']} ist unverändert, Pläne werden übernommen.")
+        plan_metrics.reused = True
+        return fingerprint, previous["tables"]
+    if tuples is None:
+        start = perf_counter()
+        tuples = scraper.parse_links(content, plan["url"], plan["faculty"], engine, plan.get("extractor"))
+        plan_metrics.parse_seconds = perf_counter() - start
+    plan_metrics.links = len(tuples)
+    if metrics is not None:
+        metrics.add_time("parse_links", plan_metrics.parse_seconds)
+    return fingerprint, build_tables(plan, tuples, current_sem, metrics)
+
+
+def _measured(chunks, digest, plan_metrics):
+    """Pass through `chunks` while adding them to `digest` and recording the time spent waiting for them"""
+    chunks = iter(chunks)
+    while True:
+        start = perf_counter()
+        chunk = next(chunks, None)
+        plan_metrics.fetch_seconds += perf_counter() - start
+        if chunk is None:
+            return
+        plan_metrics.bytes += len(chunk)
+        digest.update(chunk)
+        yield chunk
+
+
+def build_tables(plan, tuples, current_sem, metrics=None):
+    """Create the timetable entries of `plan` from the scraped (description, url) `tuples`.
+    The time spent in the helpers is added to `metrics` if given."""
     tables = []
-    for plan in config["plans"]:
-        tuples = scraper.get_links(plan["url"], secrets, plan["faculty"])
-        if len(tuples) == 0:
-            log.warning(f"URL {plan['url']} hat keine Pläne.")
-        for label, absolute_path in tuples:
-            label = label.replace("\n", " ").replace("\r", " ")  # for logging purposes
-            if "Informatik" in plan["faculty"]:
-                sked_path = ""
-            else:
-                sked_path = absolute_path.removeprefix("https://stundenplan.ostfalia.de/")
-            faculty_short = scraper.get_faculty_shortcode(label, sked_path)
-            degree = scraper.guess_degree(label, sked_path)
-            semester = scraper.extract_semester(label, sked_path) or "Sonstige"
-            sked_id = scraper.create_id(sked_path, faculty_short, config["current_sem"], semester, label)
-            label = scraper.optimize_label(label, plan.get("shorthand_syntax", False))
-            plan_type = plan.get("type", "graphical")
-            if "alt" in sked_path:
-                label += " alt"
-            tables.append(
-                dict(
-                    timetablePath=absolute_path,
-                    label=label,
-                    faculty=plan["faculty"],
-                    type=plan_type,
-                    id=sked_id,
-                    semester=semester,
-                    degree=degree,
-                )
-            )
-        sleep(1)
-    tables = [table for table in tables if is_valid_item(table, set(config["timetable_blacklist"]))]
+    # Faculty specific rules from the config that are applied after the built-in ones
+    id_rules = RuleSet.from_config(plan.get("id_rules"))
+    label_rules = RuleSet.from_config(plan.get("label_rules"))
+    if len(tuples) == 0:
+        log.warning(f"URL {plan['url']} hat keine Pläne.")
+    rows = []
+    for label, absolute_path in tuples:
+        label = label.replace("\n", " ").replace("\r", " ")  # for logging purposes
+        if "Informatik" in plan["faculty"]:
+            sked_path = ""
+        else:
+            sked_path = absolute_path.removeprefix("https://stundenplan.ostfalia.de/")
+        rows.append((label, sked_path, absolute_path))
+    start = perf_counter()
+    classification = scraper.classify_links((label, sked_path) for label, sked_path, _ in rows)
+    classify_seconds = perf_counter() - start
+    create_id_seconds = optimize_label_seconds = 0.0
+    plan_type = plan.get("type", "graphical")
+    for (label, sked_path, absolute_path), faculty_short, degree, semester in zip(rows, *classification):
+        semester = semester or "Sonstige"
+        start = perf_counter()
+        sked_id = scraper.create_id(sked_path, faculty_short, current_sem, semester, label, id_rules)
+        create_id_seconds += perf_counter() - start
+        start = perf_counter()
+        label = scraper.optimize_label(label, plan.get("shorthand_syntax", False), label_rules)
+        optimize_label_seconds += perf_counter() - start
+        if "alt" in sked_path:
+            label += " alt"
+        tables.append(Timetable(absolute_path, label, plan["faculty"], plan_type, sked_id, semester, degree))
+    if metrics is not None:
+        metrics.add_time("classify_links", classify_seconds)
+        metrics.add_time("create_id", create_id_seconds)
+        metrics.add_time("optimize_label", optimize_label_seconds)
+    return tables
+
+
+def postprocess_tables(config, plan_tables, metrics=None, table_filter=None):
+    """Filter, sort and deduplicate the entries of all plans.
+
+    Args:
+        config (dict): The configuration with `plans` and `timetable_blacklist`
+        plan_tables (List[List[Timetable]]): Timetable entries of each plan in config order
+        metrics (RunMetrics): Receives the time spent in each stage. Defaults to None.
+        table_filter (TimetableFilter): Compiled exclusion rules of `config`. Defaults to None, which compiles them.
+
+    Returns:
+        List[Timetable]: The final list of timetables
+    """
+    metrics = metrics or RunMetrics()
+    tables = [table for tables_of_plan in plan_tables for table in tables_of_plan]
+    # Remember from which overview page(s) each timetable was scraped for reporting duplicated IDs
+    sources = {}
+    for plan, tables_of_plan in zip(config["plans"], plan_tables):
+        for table in tables_of_plan:
+            plan_urls = sources.setdefault(table.timetable_path, [])
+            if plan["url"] not in plan_urls:
+                plan_urls.append(plan["url"])
+    with metrics.timer("blacklist"):
+        table_filter = table_filter or TimetableFilter.from_config(config)
+        tables = [table for table in tables if log_exclusion(table, table_filter.match(table))]
     # Sort first by faculty, then by master/bachelor, then by semester and last by alphabetical label
-    tables = sorted(
-        tables,
-        key=lambda x: (
-            x["faculty"],
-            x["degree"],
-            str(x["semester"]),
-            x["label"],
-            x["id"],
-        ),
+    with metrics.timer("sort"):
+        tables = sorted(tables, key=attrgetter("sort_key"))
+    with metrics.timer("deduplicate"):
+        tables, _ = deduplicate_tables(tables, sources)
+    return tables
+
+
+def diff_tables(previous, tables):
+    """Compare the timetables of the last output with the new ones, keyed by `id` and `timetablePath`.
+
+    Args:
+        previous (List[dict]): Timetables of the last output
+        tables (List[dict]): The new timetables
+
+    Returns:
+        dict: The `added` and `removed` entries and the `modified` ones with the `changes` of each field as [old, new]
+    """
+    old_tables = {(table["id"], table["timetablePath"]): table for table in previous}
+    new_tables = {(table["id"], table["timetablePath"]): table for table in tables}
+    modified = []
+    for (sked_id, path), table in new_tables.items():
+        old = old_tables.get((sked_id, path))
+        if old is None or old == table:
+            continue
+        fields = dict.fromkeys([*old, *table])
+        changes = {field: [old.get(field), table.get(field)] for field in fields if old.get(field) != table.get(field)}
+        modified.append(dict(id=sked_id, timetablePath=path, changes=changes))
+    return dict(
+        added=[table for key, table in new_tables.items() if key not in old_tables],
+        removed=[table for key, table in old_tables.items() if key not in new_tables],
+        modified=modified,
     )
-    remove_duplicated_urls(tables)
-    raise_for_duplicated_ids(tables)
-    for out_file in out_files:
-        write_timetable_json(tables, out_file)
+
+
+def main(config, secrets, out_files, incremental=False, compact=False, output_format=None, changelog=None):
+    """Scrape all plans of `config` and write the resulting timetables to `out_files`.
+
+    Output files whose content stays the same are not rewritten. If any timetable was added, removed or modified
+    compared to the previous output, the differences are written to the JSON file `changelog`, see `diff_tables`.
+    The previous output is read from the first JSON file in `out_files`, without one every entry counts as added.
+
+    Returns:
+        RunMetrics: Timings and counters of this run
+    """
+    start = perf_counter()
+    # Compiled before fetching, so invalid exclusion rules fail fast
+    table_filter = TimetableFilter.from_config(config)
+    metrics = RunMetrics()
+    metrics.plans = [PlanMetrics(plan["url"], plan["faculty"]) for plan in config["plans"]]
+    # In incremental mode, plans whose overview page didn't change since the last run reuse their previous entries
+    state_file = state_file_for(out_files[0])
+    previous_state = load_state(state_file)["plans"] if incremental else {}
+
+    def run_plan(plan, plan_metrics):
+        previous = previous_state.get(plan_key(plan))
+        engine = config.get("parse_engine", "bs4")
+        return parse_plan(plan, secrets, config["current_sem"], previous, engine, plan_metrics, metrics)
+
+    # Fetch the overview pages concurrently, each host is still paced by the rate limiter of the scraper
+    scraper.rate_limiter.rate = config.get("requests_per_second", 1.0)
+    workers = config.get("workers", 4)
+    if workers <= 1:
+        # Run in the calling thread, which also makes the whole run visible to a profiler
+        results = list(map(run_plan, config["plans"], metrics.plans))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() yields the results in config order, so the output is identical to a serial run
+            results = list(executor.map(run_plan, config["plans"], metrics.plans))
+    if incremental:
+        state = {plan_key(plan): {"fingerprint": fp, "tables": t} for plan, (fp, t) in zip(config["plans"], results)}
+        write_state({"plans": state}, state_file)
+    tables = postprocess_tables(config, [plan_tables for _, plan_tables in results], metrics, table_filter)
+    json_files = [out_file for out_file in out_files if (output_format or output.format_for(out_file)) == "json"]
+    previous = load_published(json_files[0]) if json_files else None
+    with metrics.timer("write"):
+        written = output.write_outputs(tables, out_files, compact, output_format, only_changed=True)
+    with metrics.timer("diff"):
+        changes = diff_tables(previous or [], [table.to_dict() for table in tables])
+    log.info(f"{len(changes['added'])} Pläne neu, {len(changes['removed'])} entfernt, {len(changes['modified'])} geändert.")
+    if changelog is not None and any(changes.values()):
+        output.write_file((json.dumps(changes, indent=2, ensure_ascii=False) + "\n").encode("utf-8"), changelog)
+    if not written:
+        log.info("Keine Änderungen, die Ausgabedateien werden nicht neu geschrieben.")
 
     log.info(f"Parsed {len(tables)} timetables sucessfully into JSON.")
-    return 0
+    metrics.tables = len(tables)
+    metrics.total_seconds = perf_counter() - start
+    return metrics
+
+
+def run_batch(jobs, secrets, processes=None, compact=False, output_format=None):
+    """Scrape the plans of several configs at once, e.g. of past semesters or other deployments.
+
+    Every distinct overview URL is fetched only once, even if several configs contain it. The CPU bound link
+    extraction and ID generation is then spread over a process pool, where each page is parsed once per faculty,
+    engine and extractor and the entries are built for every config that uses it. Finally the output of each config is written
+    independently, exactly as `main` would have written it.
+
+    Args:
+        jobs (List[Tuple[dict, List[Path]]]): Pairs of a config and the output files of that config
+        secrets (dict): Dict containing `user` and `pass` to access the ostfalia timetable module
+        processes (int): Size of the process pool. Defaults to None, which uses one process per CPU. With 1 all pages
+            are parsed in the calling process.
+        compact (bool): Omit the indentation of the JSON output. Defaults to False.
+        output_format (str): Output format for all targets, see `output.write_outputs`. Defaults to None.
+
+    Returns:
+        List[RunMetrics]: Timings and counters of each config in the order of `jobs`. The fetch timings of a shared
+            overview page are reported for every config that uses it and `total_seconds` is the time from the start of
+            the batch until the output of that config was written.
+    """
+    start = perf_counter()
+    configs = [config for config, _ in jobs]
+    table_filters = [TimetableFilter.from_config(config) for config in configs]
+    run_metrics = [RunMetrics() for _ in configs]
+    for config, metrics in zip(configs, run_metrics):
+        metrics.plans = [PlanMetrics(plan["url"], plan["faculty"]) for plan in config["plans"]]
+
+    # Fetch each overview page only once, paced like the most conservative config
+    urls = list(dict.fromkeys(plan["url"] for config in configs for plan in config["plans"]))
+    scraper.rate_limiter.rate = min(config.get("requests_per_second", 1.0) for config in configs)
+
+    def fetch(url):
+        fetch_start = perf_counter()
+        content = scraper.fetch(url, secrets)
+        return content, perf_counter() - fetch_start
+
+    with ThreadPoolExecutor(max_workers=max(1, max(config.get("workers", 4) for config in configs))) as executor:
+        pages = dict(zip(urls, executor.map(fetch, urls)))
+
+    # Group the plans by what the link extraction depends on, so every page is parsed only once per faculty, engine and extractor
+    groups = {}
+    for config_index, config in enumerate(configs):
+        engine = config.get("parse_engine", "bs4")
+        for plan_index, plan in enumerate(config["plans"]):
+            variants = groups.setdefault((plan["url"], plan["faculty"], engine, plan.get("extractor")), [])
+            variants.append((config_index, plan_index, plan, config["current_sem"]))
+
+    tasks = [
+        (pages[url][0], url, faculty, engine, extractor, [(plan, current_sem) for _, _, plan, current_sem in variants])
+        for (url, faculty, engine, extractor), variants in groups.items()
+    ]
+    if processes == 1:
+        results = [_parse_page(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_parse_page, *task) for task in tasks]
+            results = [future.result() for future in futures]
+    plan_tables = [[None] * len(config["plans"]) for config in configs]
+    for ((url, _, _, _), variants), (parse_seconds, links, built) in zip(groups.items(), results):
+        content, fetch_seconds = pages[url]
+        for (config_index, plan_index, _, _), (tables, helper_seconds) in zip(variants, built):
+            plan_tables[config_index][plan_index] = tables
+            metrics = run_metrics[config_index]
+            plan_metrics = metrics.plans[plan_index]
+            plan_metrics.fetch_seconds = fetch_seconds
+            plan_metrics.bytes = len(content)
+            plan_metrics.parse_seconds = parse_seconds
+            plan_metrics.links = links
+            metrics.add_time("parse_links", parse_seconds)
+            for helper, seconds in helper_seconds.items():
+                metrics.add_time(helper, seconds)
+
+    for (config, out_files), tables_of_plans, metrics, table_filter in zip(jobs, plan_tables, run_metrics, table_filters):
+        tables = postprocess_tables(config, tables_of_plans, metrics, table_filter)
+        with metrics.timer("write"):
+            output.write_outputs(tables, out_files, compact, output_format, only_changed=True)
+        log.info(f"Parsed {len(tables)} timetables sucessfully into {', '.join(str(out_file) for out_file in out_files)}.")
+        metrics.tables = len(tables)
+        metrics.total_seconds = perf_counter() - start
+    return run_metrics
+
+
+def _parse_page(content, url, faculty, engine, extractor, variants):
+    """Extract the links of an overview page once and build the entries of each (plan, current_sem) variant.
+    Runs in the worker processes of `run_batch`, so it only gets and returns plain data."""
+    start = perf_counter()
+    tuples = scraper.parse_links(content, url, faculty, engine, extractor)
+    parse_seconds = perf_counter() - start
+    built = []
+    for plan, current_sem in variants:
+        metrics = RunMetrics()
+        tables = build_tables(plan, tuples, current_sem, metrics)
+        built.append((tables, metrics.helper_seconds))
+    return parse_seconds, len(tuples), built
+
+
+def load_published(out_file):
+    """Return the timetables of an existing JSON output file or None if there is none."""
+    try:
+        with open(out_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def watch(config, secrets, out_files, interval=300, jitter=0.1, compact=False, output_format=None, cycles=None):
+    """Stay resident and poll every overview page again every `interval` seconds.
+
+    Each plan is polled on its own schedule that is spread by a random `jitter`, so the requests don't come in bursts.
+    With an installed HTTP cache every poll is a conditional request, so unchanged pages cost only a 304.
+    Only plans whose fingerprint changed are parsed again and the outputs are only rewritten when the resulting list
+    of timetables differs from the published one. Failed polls are logged and retried at the next interval.
+
+    Args:
+        config (dict): The configuration
+        secrets (dict): Dict containing `user` and `pass` to access the ostfalia timetable module
+        out_files (List[Path]): Where to publish the timetables
+        interval (float): Seconds between two polls of the same plan. Defaults to 300.
+        jitter (float): Maximum random deviation from `interval` as a fraction of it. Defaults to 0.1.
+        compact (bool): Omit the indentation of the JSON output. Defaults to False.
+        output_format (str): Output format for all targets, see `output.write_outputs`. Defaults to None.
+        cycles (int): Stop after this many poll cycles. Defaults to None, which polls forever.
+    """
+    plans = config["plans"]
+    engine = config.get("parse_engine", "bs4")
+    scraper.rate_limiter.rate = config.get("requests_per_second", 1.0)
+    state = {}
+    published = load_published(out_files[0])
+    table_filter = TimetableFilter.from_config(config)
+    next_poll = [monotonic()] * len(plans)
+
+    def poll(plan):
+        try:
+            return parse_plan(plan, secrets, config["current_sem"], state.get(plan_key(plan)), engine)
+        except requests.RequestException as e:
+            log.error(f"Abruf von {plan['url']} fehlgeschlagen: {e}")
+        except Exception:
+            # Keep the daemon alive on parsing errors too, the plan keeps its previous state until the next poll
+            log.exception(f"Auswertung von {plan['url']} fehlgeschlagen")
+        return None
+
+    cycle = 0
+    with ThreadPoolExecutor(max_workers=max(1, config.get("workers", 4))) as executor:
+        while cycles is None or cycle < cycles:
+            wait = min(next_poll) - monotonic()
+            if wait > 0:
+                sleep(wait)
+            now = monotonic()
+            due = [i for i, due_at in enumerate(next_poll) if due_at <= now]
+            changed = False
+            for i, result in zip(due, executor.map(poll, [plans[i] for i in due])):
+                next_poll[i] = monotonic() + interval * random.uniform(1 - jitter, 1 + jitter)
+                if result is None:
+                    continue
+                key = plan_key(plans[i])
+                fingerprint, tables = result
+                if state.get(key, {}).get("fingerprint") != fingerprint:
+                    state[key] = {"fingerprint": fingerprint, "tables": tables}
+                    changed = True
+            cycle += 1
+            # Publish only once every plan was fetched successfully at least once
+            if not changed or len(state) < len({plan_key(plan) for plan in plans}):
+                continue
+            tables = postprocess_tables(config, [state[plan_key(plan)]["tables"] for plan in plans], table_filter=table_filter)
+            if [table.to_dict() for table in tables] == published:
+                log.debug("Pläne haben sich geändert, das Ergebnis aber nicht.")
+                continue
+            output.write_outputs(tables, out_files, compact, output_format)
+            published = [table.to_dict() for table in tables]
+            log.info(f"Parsed {len(tables)} timetables sucessfully into JSON.")
@@ -0,0 +1,140 @@
+"""Persistent on-disk HTTP cache for the overview pages using conditional requests."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+log = logging.getLogger("sked_parser")
+
+
+def default_cache_dir():
+    """Return the default cache directory, which respects `XDG_CACHE_HOME`."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "sked_parser"
+
+
+class CacheEntry:
+    """A cached response body together with its validators. The body is only read from disk when it's accessed."""
+
+    def __init__(self, url, body_path, etag=None, last_modified=None, stored_at=0.0):
+        self.url = url
+        self.body_path = body_path
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    @property
+    def body(self):
+        return self.body_path.read_bytes()
+
+    def iter_body(self, chunk_size=64 * 1024):
+        """Yield the body in chunks of `chunk_size` bytes."""
+        with open(self.body_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def is_fresh(self, ttl):
+        """Whether the entry is younger than `ttl` seconds and may be used without asking the server."""
+        return time.time() - self.stored_at < ttl
+
+    def conditional_headers(self):
+        """Headers that let the server answer with `304 Not Modified` if the page didn't change."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """Stores response bodies and their ETag / Last-Modified validators in `directory`.
+
+    Args:
+        directory (Path): Directory for the cache files, is created if it doesn't exist.
+        ttl (float): Seconds in which a stored page is used without revalidating it. Defaults to 600.
+        max_size (int): Maximum total size of all stored bodies in bytes. The least recently used entries are evicted first.
+    """
+
+    def __init__(self, directory, ttl=600, max_size=100 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    def get(self, url):
+        """Return the `CacheEntry` for `url` or None if it isn't cached."""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            # Mark the entry as recently used for the eviction
+            os.utime(body_path)
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(url, body_path, meta.get("etag"), meta.get("last_modified"), meta.get("stored_at", 0.0))
+
+    def put(self, url, body, headers):
+        """Store `body` for `url` along with the validators from the response `headers`."""
+        for _ in self.store_stream(url, [body], headers):
+            pass
+
+    def store_stream(self, url, chunks, headers):
+        """Pass through the body `chunks` of `url` and store them once the body is complete.
+
+        The body is written into a temporary file while it's downloaded, so it is never held in memory as a whole.
+        If the iteration is aborted, nothing is stored.
+        """
+        meta_path, body_path = self._paths(url)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            with self._lock:
+                os.replace(tmp_path, body_path)
+                self._write_meta(meta_path, url, headers.get("ETag"), headers.get("Last-Modified"))
+                self._evict()
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def touch(self, url):
+        """Reset the age of an entry after the server confirmed that it's still valid."""
+        entry = self.get(url)
+        if entry is not None:
+            with self._lock:
+                self._write_meta(self._paths(url)[0], url, entry.etag, entry.last_modified)
+
+    def _write_meta(self, meta_path, url, etag, last_modified):
+        meta = {"url": url, "etag": etag, "last_modified": last_modified, "stored_at": time.time()}
+        self._write_atomic(meta_path, json.dumps(meta).encode())
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _evict(self):
+        """Remove the least recently used entries until the bodies fit into `max_size`."""
+        bodies = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.directory.glob("*.body")]
+        total = sum(size for _, size, _ in bodies)
+        for _, size, body_path in sorted(bodies):
+            if total <= self.max_size:
+                break
+            log.debug(f"Evicting {body_path.name} from the HTTP cache")
+            body_path.unlink(missing_ok=True)
+            body_path.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
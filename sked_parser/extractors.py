@@ -0,0 +1,301 @@
+"""Layout specific extractors of the timetable links on the overview pages.
+
+Each faculty lists its timetables in a slightly different layout. The extractor of a plan is selected with the
+`extractor` key of the plan in the config.yaml, new layouts are added by registering another `LinkExtractor` subclass.
+Every extractor works on BeautifulSoup trees for the "bs4" engine and on lxml elements for the "lxml" and "stream"
+engines, see `scraper.parse_links`. The descriptions are built from `Node`s that wrap the elements of either engine,
+so a layout only implements `LinkExtractor.describe` once and gets the same links from every engine.
+"""
+
+import re
+from abc import ABC, abstractmethod
+from urllib.parse import urljoin
+
+# Maps the name of a layout to the extractor instance that is used for all pages of that layout
+extractors = {}
+
+# Extractors of the plans without an `extractor` key, selected by a part of the faculty name
+FACULTY_EXTRACTORS = {"Informatik": "fips", "Wirtschaft": "details", "Recht": "ordered_list"}
+
+
+def register_extractor(name):
+    """Class decorator that registers an instance of a `LinkExtractor` subclass under `name`."""
+
+    def decorator(cls):
+        extractors[name] = cls()
+        return cls
+
+    return decorator
+
+
+def extractor_for(name=None, faculty=""):
+    """Return the extractor registered as `name`. Without a name it's selected from the `faculty` name.
+
+    Raises:
+        ValueError: If no extractor is registered as `name`
+    """
+    if name is None:
+        name = next((layout for part, layout in FACULTY_EXTRACTORS.items() if part in faculty), "generic")
+    try:
+        return extractors[name]
+    except KeyError:
+        raise ValueError(f"Unknown link extractor {name}") from None
+
+
+@register_extractor("generic")
+class LinkExtractor:
+    """Layout of most faculties, where each anchor to a timetable is described by its own text.
+
+    Subclasses set `url_pattern` to change which links are timetables and override `describe` to change the
+    descriptions. The pattern is compiled once, when the extractor is registered.
+    """
+
+    url_pattern = r"^https://stundenplan.ostfalia.de/\w/.+\.(html|csv)$"
+    # Finished elements that the stream engine keeps, because the descriptions of later anchors refer to them
+    retained_tags = ()
+
+    def __init__(self):
+        self.valid_url_regex = re.compile(self.url_pattern, re.IGNORECASE)
+
+    def timetable_url(self, href, overview_url):
+        """Return the absolute URL of `href` if it links to a timetable, otherwise None."""
+        absolute_url = urljoin(overview_url, href)
+        if absolute_url.endswith("index.html") or not self.valid_url_regex.match(absolute_url):
+            return None
+        return absolute_url
+
+    def extract_soup(self, soup, overview_url):
+        """Return the set of (description, absolute url) tuples of a BeautifulSoup tree."""
+        tables = set()
+        memo = {}
+        for anchor in soup.find_all("a", href=True):
+            link = self.link(SoupNode(anchor, memo), overview_url)
+            if link is not None:
+                tables.add(link)
+        return tables
+
+    def extract_tree(self, root, overview_url):
+        """Return the set of (description, absolute url) tuples of an lxml tree."""
+        tables = set()
+        memo = {}
+        for anchor in root.iter("a"):
+            link = self.link(TreeNode(anchor, memo), overview_url)
+            if link is not None:
+                tables.add(link)
+        return tables
+
+    def link(self, anchor, overview_url):
+        """Return the (description, absolute url) tuple of the `anchor` node or None if it doesn't link to a timetable.
+        Is also called by the stream engine as soon as the anchor is parsed."""
+        href = anchor.get("href")
+        if href is None:
+            return None
+        absolute_url = self.timetable_url(href, overview_url)
+        if absolute_url is None:
+            return None
+        return self.describe(anchor), absolute_url
+
+    def describe(self, anchor):
+        """Return the description of the `anchor` node to a timetable."""
+        return anchor.text
+
+
+@register_extractor("fips")
+class FipsExtractor(LinkExtractor):
+    """Informatik, which links to the timetables of the fips intranet."""
+
+    url_pattern = r"^https://intranet-i.ostfalia.de/fips/stundenplan/\d+\.html$"
+
+
+@register_extractor("details")
+class DetailsExtractor(LinkExtractor):
+    """Wirtschaft, which groups the semesters of each course in a `<details>` block with the course name as summary.
+
+    The description is prefixed with the summary of the closest `<details>` block around the anchor, which the bs4
+    and lxml engines read only once per block. Anchors outside of a block are described by their own text.
+    """
+
+    retained_tags = ("summary",)
+
+    def describe(self, anchor):
+        desc = super().describe(anchor)
+        details = anchor.closest("details")
+        if details is None:
+            return desc
+        if anchor.memo is None:
+            return self.prefix(details) + desc
+        prefix = anchor.memo.get(details.key)
+        if prefix is None:
+            prefix = anchor.memo[details.key] = self.prefix(details)
+        return prefix + desc
+
+    def prefix(self, details):
+        """Return the summary of the `details` node followed by a space or "" if the block has no summary."""
+        summary = details.child("summary")
+        return summary.text + " " if summary is not None else ""
+
+
+@register_extractor("ordered_list")
+class OrderedListExtractor(LinkExtractor):
+    """Recht, which lists the semesters of each course in an `<ol>` right after the course name.
+    The description of the anchors in such a list is prefixed with the text right before the list."""
+
+    def describe(self, anchor):
+        desc = super().describe(anchor)
+        parent = anchor.parent
+        ordered_list = parent.parent if parent is not None else None
+        if ordered_list is not None and ordered_list.tag == "ol":
+            prefix = ordered_list.previous_string
+            if prefix is not None:
+                desc = prefix + " " + desc
+        return desc
+
+
+class Node(ABC):
+    """Engine independent view of an element of the overview page, as passed to `LinkExtractor.describe`.
+
+    Attributes:
+        element: The wrapped BeautifulSoup tag or lxml element
+        memo (dict): Shared by all nodes of one extraction, so that `describe` can look up what many anchors have in
+            common only once, keyed by the `key` of a node. None for the stream engine, which discards finished elements.
+    """
+
+    __slots__ = ("element", "memo")
+
+    def __init__(self, element, memo=None):
+        self.element = element
+        self.memo = memo
+
+    @property
+    @abstractmethod
+    def key(self):
+        """Hashable identity of the element, which is valid during one extraction"""
+
+    @property
+    @abstractmethod
+    def tag(self):
+        """Lowercase tag name of the element"""
+
+    @property
+    @abstractmethod
+    def text(self):
+        """All text inside the element without leading and trailing whitespace"""
+
+    @property
+    @abstractmethod
+    def parent(self):
+        """Node of the parent element or None for the root element"""
+
+    @property
+    @abstractmethod
+    def previous_string(self):
+        """The string that was parsed right before the element or None if an element ended right before it"""
+
+    @abstractmethod
+    def get(self, name):
+        """Return the value of the attribute `name` or None if the element doesn't have it."""
+
+    @abstractmethod
+    def child(self, tag):
+        """Return the node of the first direct child with `tag` or None if there is none."""
+
+    @abstractmethod
+    def closest(self, tag):
+        """Return the node of the closest ancestor with `tag` or None if there is none."""
+
+
+class SoupNode(Node):
+    """`Node` of a BeautifulSoup tag, used by the "bs4" engine."""
+
+    __slots__ = ()
+
+    @property
+    def key(self):
+        # Tags compare and hash by their content, so two blocks with the same markup would share one key
+        return id(self.element)
+
+    @property
+    def tag(self):
+        return self.element.name
+
+    @property
+    def text(self):
+        return self.element.get_text().strip()
+
+    @property
+    def parent(self):
+        parent = self.element.parent
+        # The BeautifulSoup object itself is the parent of the root element
+        return SoupNode(parent, self.memo) if parent is not None and parent.parent is not None else None
+
+    @property
+    def previous_string(self):
+        previous = self.element.previous
+        return str(previous) if isinstance(previous, str) else None
+
+    def get(self, name):
+        return self.element.get(name)
+
+    def child(self, tag):
+        child = self.element.find(tag, recursive=False)
+        return SoupNode(child, self.memo) if child is not None else None
+
+    def closest(self, tag):
+        ancestor = self.element.find_parent(tag)
+        return SoupNode(ancestor, self.memo) if ancestor is not None else None
+
+
+class TreeNode(Node):
+    """`Node` of an lxml element, used by the "lxml" and "stream" engines."""
+
+    __slots__ = ()
+
+    @property
+    def key(self):
+        # The element itself, which also keeps its proxy and thereby its identity alive as long as it's in the memo
+        return self.element
+
+    @property
+    def tag(self):
+        return self.element.tag
+
+    @property
+    def text(self):
+        return self.element.xpath("string()").strip()
+
+    @property
+    def parent(self):
+        parent = self.element.getparent()
+        return TreeNode(parent, self.memo) if parent is not None else None
+
+    @property
+    def previous_string(self):
+        return _previous_string(self.element)
+
+    def get(self, name):
+        return self.element.get(name)
+
+    def child(self, tag):
+        child = self.element.find(tag)
+        return TreeNode(child, self.memo) if child is not None else None
+
+    def closest(self, tag):
+        ancestor = next(self.element.iterancestors(tag), None)
+        return TreeNode(ancestor, self.memo) if ancestor is not None else None
+
+
+def _last_string(element):
+    """Return the string that was parsed last inside `element`, or None if it ends with an empty tag."""
+    if len(element):
+        child = element[-1]
+        return child.tail or _last_string(child)
+    return element.text
+
+
+def _previous_string(element):
+    """Return the string that was parsed right before `element`, equivalent to the `previous` attribute of bs4."""
+    sibling = element.getprevious()
+    if sibling is not None:
+        return sibling.tail or _last_string(sibling)
+    parent = element.getparent()
+    return parent.text if parent is not None else None
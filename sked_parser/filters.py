@@ -0,0 +1,127 @@
+"""Exclusion rules that remove unwanted timetables (e.g. Klausurenpläne) from the output."""
+
+import re
+import warnings
+from typing import NamedTuple, Optional
+
+
+class ExclusionRule(NamedTuple):
+    """Excludes every timetable whose `field` contains `pattern`, case insensitive.
+
+    `field` is either "path", "label" or "any" for both. `pattern` is a literal string or a regular expression if
+    `regex` is set. If `faculty` is given, the rule only applies to timetables of that faculty.
+    """
+
+    pattern: str
+    field: str = "any"
+    faculty: Optional[str] = None
+    regex: bool = False
+    reason: str = ""
+
+
+# Exclusions that apply regardless of the config, checked before the blacklist of the config
+BUILTIN_EXCLUSIONS = (
+    ExclusionRule("block", "path", "Elektrotechnik", reason="Blockveranstaltungen (Fakultät E) erstmal raus"),
+    ExclusionRule("fernstudiengang", "label", "Soziale Arbeit", reason="schlechte Formatierung, wird ignoriert"),
+)
+
+
+class TimetableFilter:
+    """Matches timetables against all exclusion rules at once.
+
+    Every regex rule is compiled on creation, so an invalid pattern is reported before any page is fetched. The
+    rules that apply to a faculty are combined into one regex per field, which is compiled the first time a timetable
+    of that faculty is checked. So each timetable is checked in a single pass over its lowercase path and label, no
+    matter how many rules there are. Regex rules with groups of their own (e.g. backreferences) or global flags can't
+    be part of the combined regex and are searched separately.
+    """
+
+    def __init__(self, rules=BUILTIN_EXCLUSIONS):
+        self.rules = tuple(rules)
+        # Index of each rule that is searched separately -> its compiled regex
+        self._separate = {}
+        for i, rule in enumerate(self.rules):
+            if rule.field not in ("path", "label", "any"):
+                raise ValueError(f"Unknown field {rule.field} of exclusion rule {rule.pattern}")
+            if rule.regex:
+                try:
+                    regex = re.compile(rule.pattern, re.IGNORECASE)
+                except re.error as e:
+                    raise ValueError(f"Invalid regex {rule.pattern} of exclusion rule: {e}") from None
+                if regex.groups or not _combinable(rule.pattern):
+                    self._separate[i] = regex
+        self._compiled = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the filter of a config: the built-in exclusions, then `timetable_exclusions`, which is a list of
+        `{pattern, field, faculty, regex, reason}` dicts, and last the plain strings of `timetable_blacklist`.
+
+        Raises:
+            ValueError: If a rule has an unknown field or an invalid regex
+        """
+        rules = list(BUILTIN_EXCLUSIONS)
+        for entry in config.get("timetable_exclusions") or ():
+            field = entry.get("field", "any")
+            rules.append(ExclusionRule(entry["pattern"], field, entry.get("faculty"), entry.get("regex", False), entry.get("reason", "")))
+        rules.extend(ExclusionRule(str(forbidden)) for forbidden in config.get("timetable_blacklist") or ())
+        return cls(rules)
+
+    def match(self, table):
+        """Return the rule that excludes the timetable `table` and which field matched, or None if it's allowed.
+        If several rules match, the path is checked before the label and the leftmost match in it wins. Of the rules
+        matching at the same position, the first one wins.
+
+        Returns:
+            Optional[Tuple[ExclusionRule, str]]: The matching rule and "path" or "label"
+        """
+        path_regexes, label_regexes = self._regexes(table.faculty)
+        for field, (regex, separate), value in (("path", path_regexes, table.path_lower), ("label", label_regexes, table.label_lower)):
+            best = None
+            if regex is not None:
+                m = regex.search(value)
+                if m is not None:
+                    best = (m.start(), int(m.lastgroup[1:]))
+            for i, separate_regex in separate:
+                m = separate_regex.search(value)
+                if m is not None and (best is None or (m.start(), i) < best):
+                    best = (m.start(), i)
+            if best is not None:
+                return self.rules[best[1]], field
+        return None
+
+    def __call__(self, table):
+        """Return whether `table` is allowed in spluseins"""
+        return self.match(table) is None
+
+    def _regexes(self, faculty):
+        regexes = self._compiled.get(faculty)
+        if regexes is None:
+            regexes = self._compiled[faculty] = tuple(self._compile(field, faculty) for field in ("path", "label"))
+        return regexes
+
+    def _compile(self, field, faculty):
+        """Return the combined regex of the rules for `field` and `faculty` and the (index, regex) pairs of the rules
+        that are searched separately."""
+        alternatives = []
+        separate = []
+        for i, rule in enumerate(self.rules):
+            if rule.field not in (field, "any") or rule.faculty not in (None, faculty):
+                continue
+            if i in self._separate:
+                separate.append((i, self._separate[i]))
+            else:
+                alternatives.append(f"(?P<r{i}>{rule.pattern if rule.regex else re.escape(rule.pattern.lower())})")
+        return (re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None), separate
+
+
+def _combinable(pattern):
+    """Return whether the group-free `pattern` can be an alternative in the middle of another regex."""
+    try:
+        with warnings.catch_warnings():
+            # Python < 3.11 only warns about global flags that aren't at the start
+            warnings.simplefilter("error", DeprecationWarning)
+            re.compile(f"x|(?P<r0>{pattern})")
+    except (re.error, DeprecationWarning):
+        return False
+    return True
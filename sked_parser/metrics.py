@@ -0,0 +1,121 @@
+"""Timings and counters that are collected while running the pipeline."""
+
+import json
+import threading
+from time import perf_counter
+
+
+class PlanMetrics:
+    """Metrics of a single overview page.
+
+    Attributes:
+        url (str): URL of the overview page
+        faculty (str): Faculty name of the plan
+        fetch_seconds (float): Time spent waiting for the page body, either from the network or the cache
+        bytes (int): Size of the page body in bytes
+        parse_seconds (float): Time spent extracting the links from the page
+        links (int): Number of timetable links found on the page
+        reused (bool): Whether the entries of the last incremental run were reused
+    """
+
+    def __init__(self, url, faculty):
+        self.url = url
+        self.faculty = faculty
+        self.fetch_seconds = 0.0
+        self.bytes = 0
+        self.parse_seconds = 0.0
+        self.links = 0
+        self.reused = False
+
+    def to_dict(self):
+        return dict(
+            url=self.url,
+            faculty=self.faculty,
+            fetch_seconds=self.fetch_seconds,
+            bytes=self.bytes,
+            parse_seconds=self.parse_seconds,
+            links=self.links,
+            reused=self.reused,
+        )
+
+
+class RunMetrics:
+    """Metrics of a whole run of `app.main`, which returns them.
+
+    Attributes:
+        plans (List[PlanMetrics]): Metrics of each overview page in config order
+        helper_seconds (Dict[str, float]): Cumulative time spent in each helper and stage, summed over all threads
+        total_seconds (float): Wall clock time of the whole run
+        tables (int): Number of timetables in the output
+    """
+
+    def __init__(self):
+        self.plans = []
+        self.helper_seconds = {}
+        self.total_seconds = 0.0
+        self.tables = 0
+        self._lock = threading.Lock()
+
+    def add_time(self, helper, seconds):
+        """Add `seconds` to the cumulative time of `helper`. Safe to call from multiple threads."""
+        with self._lock:
+            self.helper_seconds[helper] = self.helper_seconds.get(helper, 0.0) + seconds
+
+    def timer(self, helper):
+        """Context manager that adds the time spent inside it to `helper`."""
+        return _Timer(self, helper)
+
+    def to_dict(self):
+        return dict(
+            total_seconds=self.total_seconds,
+            tables=self.tables,
+            helper_seconds=dict(self.helper_seconds),
+            plans=[plan.to_dict() for plan in self.plans],
+        )
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False) + "\n"
+
+    def to_prometheus(self):
+        """Format the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP sked_parser_{name} {help_text}")
+            lines.append(f"# TYPE sked_parser_{name} gauge")
+            for labels, value in samples:
+                label_str = ",".join(f'{key}="{_escape_label(str(val))}"' for key, val in labels.items())
+                label_str = f"{{{label_str}}}" if label_str else ""
+                lines.append(f"sked_parser_{name}{label_str} {float(value)!r}")
+
+        metric("run_seconds", "Wall clock time of the whole run", [({}, self.total_seconds)])
+        metric("tables", "Number of timetables in the output", [({}, self.tables)])
+        helper_samples = [({"helper": helper}, seconds) for helper, seconds in self.helper_seconds.items()]
+        metric("helper_seconds", "Cumulative time spent in each helper and stage", helper_samples)
+        for attribute, help_text in [
+            ("fetch_seconds", "Time spent waiting for the overview page body"),
+            ("bytes", "Size of the overview page body in bytes"),
+            ("parse_seconds", "Time spent extracting the links from the overview page"),
+            ("links", "Number of timetable links found on the overview page"),
+            ("reused", "Whether the entries of the last incremental run were reused"),
+        ]:
+            samples = [({"faculty": plan.faculty, "url": plan.url}, getattr(plan, attribute)) for plan in self.plans]
+            metric(f"plan_{attribute}", help_text, samples)
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    def __init__(self, metrics, helper):
+        self.metrics = metrics
+        self.helper = helper
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.helper, perf_counter() - self.start)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
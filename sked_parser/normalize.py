@@ -0,0 +1,111 @@
+"""Table driven substitution rules used for normalizing timetable IDs and labels."""
+
+import re
+from typing import NamedTuple
+
+
+class Rule(NamedTuple):
+    """A single substitution, `pattern` is either a literal string or a regular expression if `regex` is set."""
+
+    pattern: str
+    replacement: str = ""
+    regex: bool = False
+    flags: int = 0
+
+
+class RuleSet:
+    """Ordered list of substitution rules that are compiled once when the rule set is created.
+
+    All rules are applied one after another in declaration order. Literal rules use `str.replace`, so text that is
+    joined by an earlier removal is matched by the later rules, exactly like the chains of replace calls they replace.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = tuple(rule if isinstance(rule, Rule) else Rule(*rule) for rule in rules)
+        self._passes = _compile(self.rules)
+
+    @classmethod
+    def from_config(cls, entries):
+        """Create a rule set from a list of `{pattern, replace, regex}` dicts of the config.yaml"""
+        return cls(Rule(entry["pattern"], entry.get("replace", ""), entry.get("regex", False)) for entry in entries or ())
+
+    def apply(self, text):
+        for substitute in self._passes:
+            text = substitute(text)
+        return text
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __eq__(self, other):
+        return isinstance(other, RuleSet) and self.rules == other.rules
+
+    def __hash__(self):
+        return hash(self.rules)
+
+
+def _compile(rules):
+    passes = []
+    for rule in rules:
+        if rule.regex:
+            regex = re.compile(rule.pattern, rule.flags)
+            passes.append(lambda text, regex=regex, replacement=rule.replacement: regex.sub(replacement, text))
+        else:
+            passes.append(lambda text, pattern=rule.pattern, replacement=rule.replacement: text.replace(pattern, replacement))
+    return passes
+
+
+# Rules applied to the part of the sked path that is used as ID
+ID_RULES = RuleSet(
+    [
+        # Replace any non alphanumeric chars with underscore and remove duplicated underscores
+        Rule(r"\W+", "_", regex=True, flags=re.ASCII),
+        Rule(r"_+(?=_|$)", "", regex=True),
+        # Remove any strings like SoSe, WS, SS including the year from the id
+        Rule(r"((s|w)s|(so|w)se)(_?\d+)(_\d+)?_?", "", regex=True),
+        # Remove some faculty specific stuff to shorten the id:
+        Rule("semester_"),
+        Rule("_semester"),
+        Rule("_sem"),
+        Rule("soziale_arbeit"),
+        Rule("wirtschaftsingenieur_"),
+        Rule("energie_und_gebaeudetechnik_"),
+        Rule("bio_und_umwelttechnik_"),
+        Rule("bachelor"),
+        Rule("b_sc"),
+        Rule("m_sc", "m"),
+        Rule("energie_"),
+        Rule("umwelt_"),
+        Rule("stdgrp_"),  # weird faculty S specific string
+        Rule("stjg_"),  # weird faculty K specific string
+    ]
+)
+
+# Rules applied to the label before the shorthand syntax is resolved
+LABEL_RULES = RuleSet(
+    [
+        Rule("S-"),
+        Rule("I-"),
+        Rule("B.Sc."),
+        Rule("I-M.Sc."),
+        Rule("Bachelor"),
+        Rule("Master"),
+        Rule("- WiSe 21/22"),
+        Rule(".csv"),
+        # replace all (even duplicated) whitespaces by single space
+        Rule(r"\s+", " ", regex=True),
+    ]
+)
+
+# Rules applied to the label after the shorthand syntax is resolved
+LABEL_CLEANUP_RULES = RuleSet(
+    [
+        # Remove any semester related information
+        Rule(r"(\d\. ?-)?-? ?\d\.?\W+(Fachs|S)em(?:ester|\.)?", "", regex=True),
+        Rule("Semester"),
+        # Strip any remaining single digits
+        Rule(r"[_-]\d(?=_|$)", "", regex=True),
+        # Remove duplicated spaces
+        Rule("  ", " "),
+    ]
+)
@@ -0,0 +1,148 @@
+"""Output writers that encode the timetables once per format and write the result atomically to all targets."""
+
+import filecmp
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# Maps the name of a format to its encoder and the file extensions that select it
+writers = {}
+extensions = {}
+
+
+def register_writer(name, *file_extensions):
+    """Decorator that registers an encoder for the output format `name`.
+
+    The encoder is called as `encoder(tables, compact)` and yields the encoded output in chunks of bytes.
+    Files with one of the `file_extensions` are written in that format unless a format is requested explicitly.
+    """
+
+    def decorator(encoder):
+        writers[name] = encoder
+        for extension in file_extensions:
+            extensions[extension] = name
+        return encoder
+
+    return decorator
+
+
+def to_serializable(obj):
+    """Fallback of the encoders for records like `Timetable`, which are encoded as the dict returned by `to_dict`."""
+    if not hasattr(obj, "to_dict"):
+        raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+    return obj.to_dict()
+
+
+@register_writer("json", ".json")
+def encode_json(tables, compact=False):
+    """Encode `tables` as a single JSON array, indented for readability unless `compact` is set."""
+    if compact:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=to_serializable)
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=2, default=to_serializable)
+    # iterencode yields lots of tiny strings, so group them into larger chunks before encoding
+    buffer = []
+    size = 0
+    for part in encoder.iterencode(tables):
+        buffer.append(part)
+        size += len(part)
+        if size >= 64 * 1024:
+            yield "".join(buffer).encode("utf-8")
+            buffer.clear()
+            size = 0
+    buffer.append("\n")
+    yield "".join(buffer).encode("utf-8")
+
+
+@register_writer("ndjson", ".ndjson", ".jsonl")
+def encode_ndjson(tables, compact=True):
+    """Encode `tables` as newline delimited JSON with one timetable per line."""
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=to_serializable)
+    for table in tables:
+        yield (encoder.encode(table) + "\n").encode("utf-8")
+
+
+@register_writer("msgpack", ".msgpack")
+def encode_msgpack(tables, compact=True):
+    """Encode `tables` as a msgpack array. Requires the optional `msgpack` package."""
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("Writing msgpack output requires the msgpack package to be installed") from e
+    yield msgpack.packb(tables, use_bin_type=True, default=to_serializable)
+
+
+def format_for(out_file, default="json"):
+    """Return the name of the output format that is selected by the file extension of `out_file`."""
+    return extensions.get(Path(out_file).suffix.lower(), default)
+
+
+def write_outputs(tables, out_files, compact=False, output_format=None, only_changed=False):
+    """Write `tables` to all `out_files`.
+
+    Each format is encoded only once and its chunks are written to all targets of that format at the same time.
+    Every target is first written to a temporary file in the same directory and then renamed, so readers never see
+    a partially written file.
+
+    Args:
+        tables (List[Union[dict, Timetable]]): Timetables to write
+        out_files (List[Path]): Target files
+        compact (bool): Omit the indentation of the JSON output. Defaults to False.
+        output_format (str): Name of a registered format that is used for all targets. By default it's selected
+            from the file extension of each target and falls back to JSON.
+        only_changed (bool): Leave targets untouched whose content would stay the same, so their modification time
+            doesn't change either. Defaults to False.
+
+    Returns:
+        List[Path]: The targets that were written
+    """
+    targets_by_format = {}
+    for out_file in out_files:
+        targets_by_format.setdefault(output_format or format_for(out_file), []).append(Path(out_file))
+    written = []
+    for name, targets in targets_by_format.items():
+        if name not in writers:
+            raise ValueError(f"Unknown output format {name}")
+        written += _write_atomic(writers[name](tables, compact), targets, only_changed)
+    return written
+
+
+def write_file(data, out_file):
+    """Atomically replace `out_file` with the bytes `data`."""
+    _write_atomic([data], [Path(out_file)])
+
+
+def _write_atomic(chunks, targets, only_changed=False):
+    temp_files = []
+    written = []
+    try:
+        for target in targets:
+            fd, temp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+            temp_files.append((os.fdopen(fd, "wb"), temp_path, target))
+        for chunk in chunks:
+            for f, _, _ in temp_files:
+                f.write(chunk)
+        for f, temp_path, target in temp_files:
+            f.close()
+            if only_changed and target.exists() and filecmp.cmp(temp_path, target, shallow=False):
+                continue
+            os.chmod(temp_path, _file_mode(target))
+            os.replace(temp_path, target)
+            written.append(target)
+        return written
+    finally:
+        for f, temp_path, _ in temp_files:
+            f.close()
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+
+def _file_mode(target):
+    """Keep the permissions of an existing target, otherwise use the default permissions for new files."""
+    try:
+        return os.stat(target).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
@@ -1,97 +1,440 @@
+import asyncio
 import logging
 import re
-from urllib.parse import unquote, urljoin
+import threading
+from functools import lru_cache
+from time import monotonic, sleep
+from typing import List, NamedTuple
+from urllib.parse import unquote, urlsplit
 
 import requests
 from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector
+from lxml import etree
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 
-log = logging.getLogger("sked_parser")
-
+from sked_parser.cache import HttpCache
+from sked_parser.extractors import TreeNode, extractor_for
+from sked_parser.normalize import ID_RULES, LABEL_CLEANUP_RULES, LABEL_RULES
 
-# Install request cache with 10 minute expiration time to avoid spamming requests
-# import requests_cache
-# requests_cache.install_cache(expire_after=600)
+log = logging.getLogger("sked_parser")
 
 # Create a requests session with our own user agent, so it's clear who manages the automated requests.
 session = requests.Session()
 session.headers.update({"User-Agent": "Sked parser for spluseins.de", "From": "team@spluseins.de"})
 
+# (connect, read) timeout in seconds for every request, see `configure_session`
+timeout = (5.0, 30.0)
 
-def get_links(overview_url: str, auth, faculty=""):
-    """Scrape all valid timetable URLS from `overview_url`.
+
+def configure_session(
+    auth=None,
+    pool_maxsize=4,
+    retries=3,
+    backoff_factor=0.5,
+    connect_timeout=5.0,
+    read_timeout=30.0,
+):
+    """Configure the transport of the module level `session`.
+
+    Args:
+        auth (dict): Dict containing `user` and `pass`, which is used for all requests of the session. Defaults to None.
+        pool_maxsize (int): Number of connections that are kept alive per host, should match the number of workers.
+            Defaults to 4.
+        retries (int): How often a request is retried after connection errors, timeouts and 429/5xx responses.
+            Defaults to 3.
+        backoff_factor (float): Base of the exponential backoff between retries in seconds. Defaults to 0.5.
+        connect_timeout (float): Timeout for establishing a connection in seconds. Defaults to 5.
+        read_timeout (float): Timeout for waiting on data from the server in seconds. Defaults to 30.
+    """
+    global timeout
+    # The jitter of up to one backoff_factor keeps concurrent workers from retrying in lockstep
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False,
+    )
+    # One pool per host, each keeping up to `pool_maxsize` connections alive across all plans
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+    # Close the pools of the previous configuration, mounting only replaces the adapters
+    for previous in set(session.adapters.values()):
+        previous.close()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if auth is not None:
+        session.auth = _basic_auth(auth["user"], auth["pass"])
+    timeout = (connect_timeout, read_timeout)
+
+
+@lru_cache(maxsize=None)
+def _basic_auth(user, password):
+    return HTTPBasicAuth(user, password)
+
+
+configure_session()
+
+
+class RateLimiter:
+    """Thread safe token bucket rate limiter that paces requests separately for each host.
+
+    Args:
+        rate (float): Number of requests per second allowed for a single host. A rate of 0 disables the limiter.
+        burst (int): Number of requests that may be sent to a host at once before pacing kicks in. Defaults to 1.
+    """
+
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        """Reserve a request to the host of `url` and return the seconds to wait before it may be sent."""
+        if self.rate <= 0:
+            return 0.0
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            now = monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            # Refill the bucket for the elapsed time and reserve one token, which may go negative to queue up waiters
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+        return max(0.0, -tokens / self.rate)
+
+    def acquire(self, url):
+        """Block until a request to the host of `url` is allowed."""
+        wait = self.reserve(url)
+        if wait > 0:
+            sleep(wait)
+
+
+# Pace requests to each ostfalia host to one per second by default, can be overridden from the config
+rate_limiter = RateLimiter()
+
+# Optional on-disk cache for the overview pages, see `install_cache`
+cache = None
+
+
+def install_cache(directory, ttl=600, max_size=100 * 1024 * 1024):
+    """Cache overview pages in `directory` and revalidate them with conditional requests after `ttl` seconds."""
+    global cache
+    cache = HttpCache(directory, ttl, max_size)
+
+
+def uninstall_cache():
+    """Disable the overview page cache again."""
+    global cache
+    cache = None
+
+
+def fetch_chunks(url, auth=None, chunk_size=64 * 1024):
+    """Download `url` and yield its body in chunks as they arrive, using the HTTP cache if one is installed.
+
+    Args:
+        url (str): URL to download
+        auth (dict): Dict containing `user` and `pass` to access the ostfalia timetable module.
+            Defaults to None, which uses the auth configured on the session.
+        chunk_size (int): Maximum size of a single chunk in bytes. Defaults to 64 KiB.
+
+    Yields:
+        bytes: Chunks of the response body
+    """
+    entry, headers = _cache_lookup(url)
+    if headers is None:
+        yield from entry.iter_body(chunk_size)
+        return
+    rate_limiter.acquire(url)
+    request_auth = _basic_auth(auth["user"], auth["pass"]) if auth is not None else None
+    with session.get(url, auth=request_auth, headers=headers, stream=True, timeout=timeout) as resp:
+        if _not_modified(url, entry, resp):
+            yield from entry.iter_body(chunk_size)
+            return
+        chunks = resp.iter_content(chunk_size)
+        if cache is not None and resp.status_code == 200:
+            chunks = cache.store_stream(url, chunks, resp.headers)
+        yield from chunks
+
+
+def fetch(url, auth=None):
+    """Return the whole body of `url`, see `fetch_chunks`.
+
+    Args:
+        url (str): URL to download
+        auth (dict): Dict containing `user` and `pass` to access the ostfalia timetable module.
+            Defaults to None, which uses the auth configured on the session.
+
+    Returns:
+        bytes: The response body
+    """
+    return b"".join(fetch_chunks(url, auth))
+
+
+def _cache_lookup(url):
+    """Return the cache entry of `url` or None and the headers of the request for it. The headers are None if the
+    entry is fresh and can be used without a request, otherwise they ask the server to revalidate the entry."""
+    entry = cache.get(url) if cache is not None else None
+    if entry is None:
+        return None, {}
+    if entry.is_fresh(cache.ttl):
+        log.debug(f"Using cached page for {url}")
+        return entry, None
+    return entry, entry.conditional_headers()
+
+
+def _not_modified(url, entry, resp):
+    """Return whether `resp` confirmed the cache `entry` of `url` with a 304. Raises for any error status."""
+    if entry is not None and resp.status_code == 304:
+        log.debug(f"Page {url} not modified since last run")
+        cache.touch(url)
+        return True
+    # Don't parse error pages, which would silently result in a plan without timetables
+    resp.raise_for_status()
+    return False
+
+
+class SessionClient:
+    """Async client that sends the requests with the synchronous `session` in a worker thread.
+
+    This is the default client of the async API. Any client with an awaitable `get(url, headers=...)`, that returns a
+    response with `status_code`, `headers`, `content` and `raise_for_status()`, can be used instead, e.g. an
+    `httpx.AsyncClient`. Auth, retries and timeouts are then configured on that client.
+
+    Args:
+        auth (dict): Dict containing `user` and `pass` to access the ostfalia timetable module. Defaults to None,
+            which uses the auth configured on the session.
+    """
+
+    def __init__(self, auth=None):
+        self.auth = _basic_auth(auth["user"], auth["pass"]) if auth is not None else None
+
+    async def get(self, url, headers=None):
+        return await asyncio.to_thread(session.get, url, auth=self.auth, headers=headers, timeout=timeout)
+
+
+async def fetch_async(url, client=None):
+    """Return the whole body of `url` without blocking the event loop, using the HTTP cache if one is installed.
+
+    Args:
+        url (str): URL to download
+        client: Async HTTP client, see `SessionClient`. Defaults to None, which uses a `SessionClient`.
+
+    Returns:
+        bytes: The response body
+    """
+    client = client or SessionClient()
+    entry, headers = _cache_lookup(url)
+    if headers is None:
+        return entry.body
+    wait = rate_limiter.reserve(url)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    resp = await client.get(url, headers=headers)
+    if _not_modified(url, entry, resp):
+        return entry.body
+    if cache is not None and resp.status_code == 200:
+        cache.put(url, resp.content, resp.headers)
+    return resp.content
+
+
+async def get_links_async(overview_url: str, client=None, faculty="", engine="bs4", extractor=None):
+    """Scrape all valid timetable URLS from `overview_url` without blocking the event loop.
+
+    The page is parsed in a worker thread, so other tasks keep running while a large page is processed.
 
     Args:
         overview_url (str): Faculty timetable overview URL that has all single timetable URLs on it
-        auth (dict): Dict containing `user` and `pass` to access the ostfalia timetable module
-        faculty (str): Faculty name. Is used for applying special scrapers based on the faculty. Defaults to "".
+        client: Async HTTP client, see `SessionClient`. Defaults to None, which uses a `SessionClient`.
+        faculty (str): Faculty name. Selects the extractor if `extractor` isn't given. Defaults to "".
+        engine (str): HTML engine used for extracting the links, see `parse_links`. Defaults to "bs4".
+        extractor (str): Name of the layout specific extractor, see `parse_links`. Defaults to None.
 
     Returns:
         Set[Tuple]: List of tuples with (url description, absolute url)
     """
-    resp = session.get(overview_url, auth=HTTPBasicAuth(auth["user"], auth["pass"]))
-    soup = BeautifulSoup(resp.content, "lxml")
-    tables: set[tuple[str, str]] = set()
-    if "Informatik" in faculty:
-        valid_url_regex = re.compile(r"^https://intranet-i.ostfalia.de/fips/stundenplan/\d+\.html$", re.IGNORECASE)
-    else:
-        valid_url_regex = re.compile(r"^https://stundenplan.ostfalia.de/\w/.+\.(html|csv)$", re.IGNORECASE)
-    for anchor_tag_href in soup.find_all("a", href=True):
-        absolute_url: str = urljoin(overview_url, anchor_tag_href["href"])
-        if absolute_url.endswith("index.html"):
+    content = await fetch_async(overview_url, client)
+    return await asyncio.to_thread(parse_links, content, overview_url, faculty, engine, extractor)
+
+
+async def get_all_links_async(plans, client=None, concurrency=4, engine="bs4"):
+    """Scrape the overview pages of all `plans` concurrently on the running event loop.
+
+    Args:
+        plans (List[dict]): Plan entries of the config with `url`, `faculty` and optionally `extractor`
+        client: Async HTTP client that is shared by all requests, see `SessionClient`. Defaults to None, which uses a
+            `SessionClient`.
+        concurrency (int): Maximum number of overview pages that are fetched and parsed at the same time. Defaults to 4.
+        engine (str): HTML engine used for extracting the links, see `parse_links`. Defaults to "bs4".
+
+    Returns:
+        List[Set[Tuple]]: The links of each plan in the order of `plans`
+    """
+    client = client or SessionClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def scrape(plan):
+        async with semaphore:
+            return await get_links_async(plan["url"], client, plan["faculty"], engine, plan.get("extractor"))
+
+    return list(await asyncio.gather(*(scrape(plan) for plan in plans)))
+
+
+def get_links(overview_url: str, auth, faculty="", engine="bs4", extractor=None):
+    """Scrape all valid timetable URLS from `overview_url`. With the "stream" engine the links are extracted while the
+    page is downloaded, see `iter_links`.
+
+    Args:
+        overview_url (str): Faculty timetable overview URL that has all single timetable URLs on it
+        auth (dict): Dict containing `user` and `pass` to access the ostfalia timetable module or None to use the auth
+            configured on the session
+        faculty (str): Faculty name. Selects the extractor if `extractor` isn't given. Defaults to "".
+        engine (str): HTML engine used for extracting the links, see `parse_links`. Defaults to "bs4".
+        extractor (str): Name of the layout specific extractor, see `parse_links`. Defaults to None.
+
+    Returns:
+        Set[Tuple]: List of tuples with (url description, absolute url)
+    """
+    if engine == "stream":
+        return set(iter_links(fetch_chunks(overview_url, auth), overview_url, faculty, extractor))
+    return parse_links(fetch(overview_url, auth), overview_url, faculty, engine, extractor)
+
+
+def parse_links(content: bytes, overview_url: str, faculty="", engine="bs4", extractor=None):
+    """Extract all valid timetable URLs from the already downloaded overview page `content`.
+
+    Args:
+        content (bytes): HTML body of the overview page
+        overview_url (str): URL of the overview page, used for resolving relative links
+        faculty (str): Faculty name. Selects the extractor if `extractor` isn't given. Defaults to "".
+        engine (str): Either "bs4", which builds a complete BeautifulSoup tree, "lxml", which only walks the anchors
+            of the plain lxml tree and is considerably faster for large pages, or "stream", see `iter_links`.
+            All of them return the same links, except for the encoding guess described in `iter_links`.
+        extractor (str): Name of the layout specific extractor, see `extractors`. Defaults to None, which selects it
+            by the faculty name.
+
+    Returns:
+        Set[Tuple]: List of tuples with (url description, absolute url)
+    """
+    layout = extractor_for(extractor, faculty)
+    if engine == "lxml":
+        root = _parse_tree(content) if content.strip() else None
+        return layout.extract_tree(root, overview_url) if root is not None else set()
+    if engine == "stream":
+        return set(iter_links([content], overview_url, faculty, extractor))
+    if engine != "bs4":
+        raise ValueError(f"Unknown parse engine {engine}")
+    return layout.extract_soup(BeautifulSoup(content, "lxml"), overview_url)
+
+
+def _parse_tree(content):
+    """Parse `content` with lxml, decoded like the "bs4" engine does: The first encoding of the candidates of bs4 that
+    lxml knows is used, i.e. the one of a byte order mark, an encoding declaration at the start of the page, the guess
+    of chardet (if installed) or else UTF-8."""
+    detector = EncodingDetector(content, is_html=True)
+    for encoding in detector.encodings:
+        try:
+            parser = etree.HTMLParser(encoding=encoding)
+        except LookupError:
             continue
-        if valid_url_regex.match(absolute_url):
-            desc: str = anchor_tag_href.text.strip()
-            # Prepend the content of the previous paragraph to the description because it contains the real name of the plan
-            if "Wirtschaft" in faculty:
-                desc = anchor_tag_href.parent.parent.find("summary").text.strip() + " " + desc
-            if "Recht" in faculty:
-                if anchor_tag_href.parent.parent.name == "ol":
-                    desc = anchor_tag_href.parent.parent.previous + " " + desc
-            tables.add((desc, absolute_url))
-    return tables
-
-
-def create_id(sked_path, faculty_short, current_sem_str, extracted_semester, label=""):
-    """Create a unique ID from the `sked_path` (timetable URL) and keep it as short as possible while maintaining readability"""
+        return etree.fromstring(detector.markup, parser)
+    return etree.fromstring(detector.markup, etree.HTMLParser())
+
+
+def iter_links(chunks, overview_url, faculty="", extractor=None):
+    """Incrementally extract the timetable links from the overview page body `chunks` while they arrive.
+
+    Each anchor is yielded as soon as its closing tag has been parsed. Whenever an element is finished, its already
+    finished preceding siblings are discarded, so even very large pages are parsed in roughly constant memory.
+    The page is decoded using its byte order mark, an encoding declaration in the first 2 KiB or else UTF-8. This is
+    the same encoding the other engines use, unless a page without declaration isn't UTF-8 and chardet is installed,
+    which the other engines let guess the encoding from the whole page.
+
+    Args:
+        chunks (Iterable[bytes]): Body of the overview page, e.g. from `fetch_chunks`
+        overview_url (str): URL of the overview page, used for resolving relative links
+        faculty (str): Faculty name. Selects the extractor if `extractor` isn't given. Defaults to "".
+        extractor (str): Name of the layout specific extractor, see `extractors`. Defaults to None.
+
+    Yields:
+        Tuple[str, str]: (url description, absolute url), may contain duplicates
+    """
+    layout = extractor_for(extractor, faculty)
+    parser = None
+    head = b""
+    for chunk in chunks:
+        if parser is None:
+            # Wait for the part of the page that may declare the encoding, before it's passed to the parser
+            head += chunk
+            if len(head) < _ENCODING_SNIFF_SIZE and _end_of_head_re.search(head) is None:
+                continue
+            parser, chunk = _pull_parser(head), head
+        if chunk:
+            parser.feed(chunk)
+            yield from _links_from_events(parser.read_events(), overview_url, layout)
+    if parser is None and head:
+        parser = _pull_parser(head)
+        parser.feed(head)
+    if parser is not None:
+        parser.close()
+        yield from _links_from_events(parser.read_events(), overview_url, layout)
+
+
+# Number of bytes at the start of a page in which an encoding declaration is expected
+_ENCODING_SNIFF_SIZE = 2048
+_end_of_head_re = re.compile(rb"</head\s*>", re.IGNORECASE)
+
+
+def _pull_parser(head):
+    _, encoding = EncodingDetector.strip_byte_order_mark(head)
+    encoding = encoding or EncodingDetector.find_declared_encoding(head[:_ENCODING_SNIFF_SIZE], is_html=True)
+    try:
+        return etree.HTMLPullParser(events=("end",), encoding=encoding or "utf-8")
+    except LookupError:
+        return etree.HTMLPullParser(events=("end",), encoding="utf-8")
+
+
+def _links_from_events(events, overview_url, layout):
+    for _, element in events:
+        if element.tag == "a":
+            link = layout.link(TreeNode(element), overview_url)
+            if link is not None:
+                yield link
+        parent = element.getparent()
+        if parent is not None:
+            # All anchors before the finished element are processed, so drop its preceding siblings. The element itself
+            # is kept, because the description of the following anchors may refer to it (see `OrderedListExtractor`).
+            for sibling in list(element.itersiblings(preceding=True)):
+                if sibling.tag not in layout.retained_tags:
+                    parent.remove(sibling)
+
+
+@lru_cache(maxsize=4096)
+def create_id(sked_path, faculty_short, current_sem_str, extracted_semester, label="", extra_rules=None):
+    """Create a unique ID from the `sked_path` (timetable URL) and keep it as short as possible while maintaining readability
+
+    `extra_rules` is an optional `RuleSet` that is applied after the built-in `ID_RULES`."""
     # Unqoute the URL first
     sked_path = unquote(sked_path)
     # Get a basic id from the url page, which is the last part excluding the .extension
-    id_re = re.compile(r"\w/(?:.*/)?(.+?)\.+(html|csv)", re.IGNORECASE)
-    m = id_re.search(sked_path)
+    m = _id_re.search(sked_path)
     if m:
         sked_id = m.group(1).lower().strip()
     else:
         sked_id = label.lower().strip()
 
-    # Replace any non alphanumeric chars with underscore and remove duplicated underscores
-    sked_id = re.sub(r"\W+", "_", sked_id, flags=re.ASCII)
-    sked_id = sked_id = re.sub(r"_+(?=_|$)", "", sked_id)
-
-    # Remove any strings like SoSe, WS, SS including the year from the id
-    sked_id = re.sub(r"((s|w)s|(so|w)se)(_?\d+)(_\d+)?_?", "", sked_id)
-
-    # Remove some faculty specific stuff to shorten the id:
-    sked_id = sked_id.replace("semester_", "")
-    sked_id = sked_id.replace("_semester", "")
-    sked_id = sked_id.replace("_sem", "")
-    sked_id = sked_id.replace("soziale_arbeit", "")
-    sked_id = sked_id.replace("wirtschaftsingenieur_", "")
-    sked_id = sked_id.replace("energie_und_gebaeudetechnik_", "")
-    sked_id = sked_id.replace("bio_und_umwelttechnik_", "")
-    sked_id = sked_id.replace("bachelor", "")
-    sked_id = sked_id.replace("b_sc", "")
-    sked_id = sked_id.replace("m_sc", "m")
-    sked_id = sked_id.replace("energie_", "")
-    sked_id = sked_id.replace("umwelt_", "")
-    sked_id = sked_id.replace("stdgrp_", "")  # weird faculty S specific string
-    sked_id = sked_id.replace("stjg_", "")  # weird faculty K specific string
+    sked_id = ID_RULES.apply(sked_id)
+    if extra_rules:
+        sked_id = extra_rules.apply(sked_id)
     # Remove unneccessary chars at end or beginning of string
     sked_id = sked_id.strip("_ ")
 
     if isinstance(extracted_semester, int):
         # If semester was successfully extracted, scrape all single digits from ID and add extracted semester back
-        sked_id = re.sub(r"(?<!\d)" + f"{extracted_semester}" + r"(?=_|$)", "", sked_id)
+        sked_id = _semester_digit_re(extracted_semester).sub("", sked_id)
         sked_id = f"{sked_id}_{extracted_semester}"
 
     # Prefix the label with the faculty shortcut
@@ -102,24 +445,36 @@ def create_id(sked_path, faculty_short, current_sem_str, extracted_semester, lab
     # Append the current semester string (sth like ws20) at the end
     sked_id = f"{sked_id}_{current_sem_str}"
     # Again remove duplicated underscores that have been introduced by the removals before
-    sked_id = re.sub(r"_+(?=_|$)", "", sked_id)
+    sked_id = _duplicated_underscores_re.sub("", sked_id)
     return sked_id
 
 
+_id_re = re.compile(r"\w/(?:.*/)?(.+?)\.+(html|csv)", re.IGNORECASE)
+_duplicated_underscores_re = re.compile(r"_+(?=_|$)")
+
+
+@lru_cache(maxsize=None)
+def _semester_digit_re(semester):
+    return re.compile(r"(?<!\d)" + f"{semester}" + r"(?=_|$)")
+
+
 def extract_semester(desc, url):
     """Extract/guess the current semester from the link description or the link using regex."""
+    return _extract_semester(desc, desc.lower(), url, url.lower())
+
+
+def _extract_semester(desc, desc_lower, url, url_lower):
     # Find any timetables that are "Wahlpflichfächer"
     for keyword in ["wahlpflicht", "wpf"]:
-        if keyword in desc.lower() or keyword in url.lower():
+        if keyword in desc_lower or keyword in url_lower:
             return "WPF"
     # should always return none
     for keyword in ["gremien", "termine"]:
-        if keyword in desc.lower() or keyword in url.lower():
+        if keyword in desc_lower or keyword in url_lower:
             return None
     # Try to extract the semester by finding a number followed by non word characters and something starting with Sem
-    sem_regex = re.compile(r"(?:^|\D)(\d)\W+(fachsem|sem|html$)", re.IGNORECASE)
-    m_desc = sem_regex.search(desc)
-    m_url = sem_regex.search(url)
+    m_desc = _sem_re.search(desc)
+    m_url = _sem_re.search(url)
     if m_desc:
         return int(m_desc.group(1))
     elif m_url:
@@ -130,6 +485,9 @@ def extract_semester(desc, url):
         return None
 
 
+_sem_re = re.compile(r"(?:^|\D)(\d)\W+(fachsem|sem|html$)", re.IGNORECASE)
+
+
 def get_faculty_shortcode(desc, sked_path):
     """Extract the faculty one letter shortcode from the link description or the provided sked path"""
     shortcode = sked_path.split("/")[0]
@@ -140,45 +498,69 @@ def get_faculty_shortcode(desc, sked_path):
     raise Exception("Could not get faculty shorthand from sked path")
 
 
-def optimize_label(desc, uses_shorthand_syntax):
-    """Optimize the user visible label by removing faculty names and try to use only the shorthand of that course if possible"""
-    desc = desc.replace("S-", "")
-    desc = desc.replace("I-", "")
-    desc = desc.replace("B.Sc.", "")
-    desc = desc.replace("I-M.Sc.", "")
-    desc = desc.replace("Bachelor", "")
-    desc = desc.replace("Master", "")
-    desc = desc.replace("- WiSe 21/22", "")
-    desc = desc.replace(".csv", "")
-    desc = re.sub(r"\s+", " ", desc)  # replace all (even duplicated) whitespaces by single space
+@lru_cache(maxsize=4096)
+def optimize_label(desc, uses_shorthand_syntax, extra_rules=None):
+    """Optimize the user visible label by removing faculty names and try to use only the shorthand of that course if possible
+
+    `extra_rules` is an optional `RuleSet` that is applied after the built-in `LABEL_CLEANUP_RULES`."""
+    desc = LABEL_RULES.apply(desc)
     if uses_shorthand_syntax:
         # Those faculties writes their modules as "long name (shorthand) additional info"
         # So discard the long name and use only the shorthand but keep the info
-        shorthand_re = re.compile(r"^.*?\((\D+?)\)(.*)$")
-        m = shorthand_re.search(desc)
+        m = _shorthand_re.search(desc)
         if m:
             shorthand = m.group(1).strip()
             additional_stuff = m.group(2).strip()
             desc = f"{shorthand} {additional_stuff}"
-    # Remove any semester related information
-    desc = re.sub(r"(\d\. ?-)?-? ?\d\.?\W+(Fachs|S)em(?:ester|\.)?", "", desc)
-    desc = desc.replace("Semester", "")
-    # Strip any remaining single digits
-    desc = re.sub(r"[_-]\d(?=_|$)", "", desc)
-    # Remove duplicated spaces
-    desc = desc.replace("  ", " ")
+    desc = LABEL_CLEANUP_RULES.apply(desc)
+    if extra_rules:
+        desc = extra_rules.apply(desc)
     return desc.strip("-_ ")
 
 
+_shorthand_re = re.compile(r"^.*?\((\D+?)\)(.*)$")
+
+
 def guess_degree(desc, link):
     """Return an estimation whether it's a master or bachelor degree"""
-    link = link.lower()
-    if "master" in desc.lower() or "m.sc" in desc.lower() or "imes" in desc.lower() or "IST" in desc or "IVG" in desc:
+    return _guess_degree(desc, desc.lower(), link.lower())
+
+
+def _guess_degree(desc, desc_lower, link):
+    if "master" in desc_lower or "m.sc" in desc_lower or "imes" in desc_lower or "IST" in desc or "IVG" in desc:
         return "Master"
     if "-m-" in link or "_m_" in link or "_ma_" in link or "-ma-" in link:
-        if "studienprofil m" in desc.lower():
+        if "studienprofil m" in desc_lower:
             return "Bachelor"
         log.info(f"Master vermutet für '{desc}'. Bitte manuell überprüfen, dass es kein Bachelor ist. Link ist {link}.")
         return "Master"
     else:
         return "Bachelor"
+
+
+class LinkClassification(NamedTuple):
+    """Parallel result columns of `classify_links`, the n-th entry of each column belongs to the n-th link."""
+
+    faculty_short: List[str]
+    degree: List[str]
+    semester: List
+
+
+def classify_links(links):
+    """Batch variant of `get_faculty_shortcode`, `guess_degree` and `extract_semester` for many links at once.
+
+    Each label and path is lowercased only once and all classifications of a row are done in a single pass.
+
+    Args:
+        links (Iterable[Tuple[str, str]]): (label, sked path) pairs
+
+    Returns:
+        LinkClassification: Columns with the faculty shortcode, degree and semester of each link
+    """
+    faculty_short, degree, semester = [], [], []
+    for label, path in links:
+        label_lower, path_lower = label.lower(), path.lower()
+        faculty_short.append(get_faculty_shortcode(label, path))
+        degree.append(_guess_degree(label, label_lower, path_lower))
+        semester.append(_extract_semester(label, label_lower, path, path_lower))
+    return LinkClassification(faculty_short, degree, semester)
@@ -0,0 +1,168 @@
+"""Archives of the raw overview pages for re-running the pipeline offline.
+
+While recording, every response of the scraper session is stored gzip compressed in a directory together with a
+`manifest.json`, which is written when the recording is saved. Replaying serves the requests of the session from such
+an archive without any network I/O, so the whole pipeline including `scraper.get_links` and `app.main` runs exactly as
+it did when the pages were recorded.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+from requests.adapters import BaseAdapter
+
+from sked_parser.output import write_file
+
+log = logging.getLogger("sked_parser")
+
+MANIFEST = "manifest.json"
+
+# Number of stored pages after which the manifest is saved even before the recording ends
+SAVE_EVERY = 100
+
+
+class SnapshotArchive:
+    """Directory with the gzip compressed bodies of the overview pages and a manifest that maps each URL to its file.
+
+    The manifest is only written by `save` and after every `SAVE_EVERY` stored pages, so recording stays linear in
+    the number of pages.
+
+    Args:
+        directory (Path): Directory of the archive, is created on the first stored page.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        try:
+            with open(self.directory / MANIFEST, "r") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {"version": 1, "pages": {}}
+
+    def store(self, url, body, status_code=200, content_type=None):
+        """Store the response `body` of `url`, replacing an earlier snapshot of the same URL."""
+        name = hashlib.sha256(url.encode()).hexdigest() + ".gz"
+        entry = dict(
+            file=name,
+            status=status_code,
+            content_type=content_type,
+            size=len(body),
+            sha256=hashlib.sha256(body).hexdigest(),
+            recorded_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # mtime=0 keeps the archive byte-identical if a page didn't change between two recordings
+            write_file(gzip.compress(body, mtime=0), self.directory / name)
+            self.manifest["pages"][url] = entry
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._save()
+
+    def save(self):
+        """Write the manifest if pages were stored since it was last written."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _save(self):
+        write_file(json.dumps(self.manifest, indent=2, sort_keys=True).encode(), self.directory / MANIFEST)
+        self._unsaved = 0
+
+    def load(self, url):
+        """Return the manifest entry and the body of `url` or None if it wasn't recorded."""
+        entry = self.manifest["pages"].get(url)
+        if entry is None:
+            return None
+        return entry, gzip.decompress((self.directory / entry["file"]).read_bytes())
+
+    def __len__(self):
+        return len(self.manifest["pages"])
+
+
+class RecordingAdapter(BaseAdapter):
+    """Transport adapter that sends the requests with `adapter` and stores every response in `archive`."""
+
+    def __init__(self, adapter, archive):
+        super().__init__()
+        self.adapter = adapter
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        resp = self.adapter.send(request, **kwargs)
+        # Reading the content here keeps it available for iter_content, even for streamed requests
+        self.archive.store(request.url, resp.content, resp.status_code, resp.headers.get("Content-Type"))
+        log.debug(f"Recorded {request.url} ({resp.status_code})")
+        return resp
+
+    def close(self):
+        self.archive.save()
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers all requests from `archive`. URLs that weren't recorded get a 404."""
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.url = request.url
+        resp.request = request
+        snapshot = self.archive.load(request.url)
+        if snapshot is None:
+            resp.status_code = 404
+            resp.reason = "Not in snapshot"
+            resp._content = b""
+        else:
+            entry, resp._content = snapshot
+            resp.status_code = entry["status"]
+            if entry["content_type"]:
+                resp.headers["Content-Type"] = entry["content_type"]
+        resp._content_consumed = True
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        return resp
+
+    def close(self):
+        pass
+
+
+def record(session, directory):
+    """Store every response of `session` in the archive `directory`, while still sending the requests with the
+    adapters that are currently mounted on it. Should be called after the session is configured. The manifest is
+    saved when the session is closed, call `SnapshotArchive.save` to save it earlier.
+
+    Returns:
+        SnapshotArchive: The archive the responses are stored in
+    """
+    archive = SnapshotArchive(directory)
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, RecordingAdapter(session.get_adapter(prefix), archive))
+    log.info(f"Recording the overview pages to {archive.directory}")
+    return archive
+
+
+def replay(session, directory):
+    """Answer all requests of `session` from the archive `directory` instead of the network.
+
+    Returns:
+        SnapshotArchive: The archive the responses are served from
+    """
+    archive = SnapshotArchive(directory)
+    if len(archive) == 0:
+        raise FileNotFoundError(f"No snapshot manifest found in {archive.directory}")
+    adapter = ReplayAdapter(archive)
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, adapter)
+    log.info(f"Replaying {len(archive)} overview pages from {archive.directory}")
+    return archive
@@ -0,0 +1,71 @@
+"""Record type of a single timetable entry as it flows through the pipeline."""
+
+
+class Timetable:
+    """A single timetable of the output.
+
+    The lowercase path and label used for filtering and the sort key are computed once on creation, so instances
+    should be treated as immutable.
+
+    Attributes:
+        timetable_path (str): Absolute URL of the timetable, `timetablePath` in the output
+        label (str): Optimized label shown in SplusEins
+        faculty (str): Faculty name of the plan
+        type (str): Type of the plan from the config, e.g. "graphical"
+        id (str): Unique ID of the timetable
+        semester (Union[int, str]): Semester number or a group name like "Sonstige"
+        degree (str): Degree of the course, e.g. "Bachelor"
+        path_lower (str): Lowercase `timetable_path`
+        label_lower (str): Lowercase `label`
+        sort_key (Tuple): Orders by faculty, then by degree, semester, label and ID
+    """
+
+    __slots__ = ("timetable_path", "label", "faculty", "type", "id", "semester", "degree", "path_lower", "label_lower", "sort_key")
+
+    def __init__(self, timetable_path, label, faculty, type, id, semester, degree):
+        self.timetable_path = timetable_path
+        self.label = label
+        self.faculty = faculty
+        self.type = type
+        self.id = id
+        self.semester = semester
+        self.degree = degree
+        self.path_lower = timetable_path.lower()
+        self.label_lower = label.lower()
+        self.sort_key = (faculty, degree, str(semester), label, id)
+
+    @classmethod
+    def from_dict(cls, table):
+        """Create a timetable from its JSON representation, see `to_dict`."""
+        return cls(
+            table["timetablePath"],
+            table["label"],
+            table["faculty"],
+            table["type"],
+            table["id"],
+            table["semester"],
+            table["degree"],
+        )
+
+    def to_dict(self):
+        """Return the JSON representation of the timetable with the keys in output order."""
+        return dict(
+            timetablePath=self.timetable_path,
+            label=self.label,
+            faculty=self.faculty,
+            type=self.type,
+            id=self.id,
+            semester=self.semester,
+            degree=self.degree,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, Timetable):
+            return NotImplemented
+        return self.sort_key == other.sort_key and self.timetable_path == other.timetable_path and self.type == other.type
+
+    def __hash__(self):
+        return hash((self.sort_key, self.timetable_path, self.type))
+
+    def __repr__(self):
+        return f"Timetable({self.id!r}, {self.timetable_path!r})"
@@ -0,0 +1 @@
+"""Benchmarks for the scrape to JSON pipeline, based on recorded overview pages."""
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+import requests
+
+from sked_parser import scraper, snapshot
+
+from ..conftest import MemoryArchive
+
+FIXTURES = Path(__file__).parent.parent / "fixtures"
+
+# Overview pages of each faculty layout, served from the recorded fixtures
+PLANS = [
+    {"url": "https://stundenplan.ostfalia.de/i/Semester/Semester-Liste/", "faculty": "Informatik", "fixture": "informatik.html"},
+    {"url": "https://stundenplan.ostfalia.de/w/", "faculty": "Wirtschaft", "fixture": "wirtschaft.html"},
+    {"url": "https://stundenplan.ostfalia.de/r/", "faculty": "Recht", "fixture": "recht.html"},
+    {"url": "https://stundenplan.ostfalia.de/e/", "faculty": "Elektrotechnik", "fixture": "generic.html"},
+]
+
+# The recorded pages are small, so their plan lists are repeated to get closer to the size of the real pages
+SCALE = 50
+
+
+def scaled_page(fixture):
+    """Return the recorded `fixture` with every anchor container repeated `SCALE` times under unique URLs."""
+    content = (FIXTURES / fixture).read_text(encoding="utf-8")
+    start, end = content.index("<body>") + len("<body>"), content.index("</body>")
+    body = content[start:end]
+    copies = [body.replace('.html"', f'{i:03d}.html"') for i in range(SCALE)]
+    return (content[:start] + "".join(copies) + content[end:]).encode("utf-8")
+
+
+@pytest.fixture(scope="session")
+def pages():
+    return {plan["url"]: scaled_page(plan["fixture"]) for plan in PLANS}
+
+
+@pytest.fixture
+def replay(pages, monkeypatch):
+    """Mount a replay adapter of the pages on `scraper.session` and disable pacing and caching"""
+    session = requests.Session()
+    session.mount("https://", snapshot.ReplayAdapter(MemoryArchive(pages)))
+    monkeypatch.setattr(scraper, "session", session)
+    monkeypatch.setattr(scraper.rate_limiter, "rate", 0)
+    monkeypatch.setattr(scraper, "cache", None)
+    return pages
+
+
+@pytest.fixture
+def config():
+    return {
+        "plans": [{key: value for key, value in plan.items() if key != "fixture"} for plan in PLANS],
+        "current_sem": "ws24",
+        "timetable_blacklist": ["gremien"],
+        "requests_per_second": 0,
+    }
@@ -0,0 +1,64 @@
+"""Benchmarks of the single pipeline stages.
+
+Run them with `pytest tests/benchmarks --benchmark-only`. Use `--benchmark-autosave` to store a run and
+`--benchmark-compare` to compare the current code against the last stored run.
+"""
+
+from operator import attrgetter
+
+import pytest
+
+from sked_parser import app, output, scraper
+
+from .conftest import PLANS
+
+pytest.importorskip("pytest_benchmark")
+
+AUTH = {"user": "user", "pass": "pass"}
+
+
+@pytest.fixture
+def tables(replay, config):
+    """All timetable entries of the recorded pages before filtering, sorting and deduplication"""
+    return [table for plan in config["plans"] for table in app.parse_plan(plan, AUTH, config["current_sem"])[1]]
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml", "stream"])
+@pytest.mark.parametrize("plan", PLANS, ids=[plan["faculty"] for plan in PLANS])
+def test_get_links(benchmark, replay, plan, engine):
+    benchmark.group = f"get_links {plan['faculty']}"
+    links = benchmark(scraper.get_links, plan["url"], AUTH, plan["faculty"], engine)
+    assert len(links) > 0
+
+
+def test_classification(benchmark, replay, config):
+    """Time the per link classification, ID creation and label optimization without the link extraction"""
+    links = {plan["url"]: scraper.get_links(plan["url"], AUTH, plan["faculty"]) for plan in config["plans"]}
+
+    def classify():
+        # The helpers are memoized, so clear their caches to measure the cold run of each iteration
+        scraper.create_id.cache_clear()
+        scraper.optimize_label.cache_clear()
+        return [app.build_tables(plan, links[plan["url"]], config["current_sem"]) for plan in config["plans"]]
+
+    result = benchmark(classify)
+    assert sum(len(plan_tables) for plan_tables in result) > 0
+
+
+def test_sort_and_deduplicate(benchmark, tables):
+    def sort_and_deduplicate():
+        return app.deduplicate_tables(sorted(tables, key=attrgetter("sort_key")))[0]
+
+    assert len(benchmark(sort_and_deduplicate)) > 0
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["indented", "compact"])
+def test_write_json(benchmark, tables, tmp_path, compact):
+    out_files = [tmp_path / "web.json", tmp_path / "server.json"]
+    benchmark(output.write_outputs, tables, out_files, compact)
+    assert out_files[0].read_bytes() == out_files[1].read_bytes()
+
+
+def test_full_pipeline(benchmark, replay, config, tmp_path):
+    benchmark(app.main, config, AUTH, [tmp_path / "timetables.json"])
+    assert (tmp_path / "timetables.json").stat().st_size > 0
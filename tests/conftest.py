@@ -0,0 +1,47 @@
+import copy
+
+import pytest
+
+_OVERVIEW_PAGES = {
+    "https://stundenplan.ostfalia.de/e/": b'<a href="semester/eit_1.html">Elektrotechnik - 1. Semester</a>',
+    "https://stundenplan.ostfalia.de/v/": b'<a href="bee/bee_2.html">Bio- und Umwelttechnik (BEE) - 2. Semester</a>',
+}
+_CONFIG = {
+    "plans": [
+        {"url": "https://stundenplan.ostfalia.de/e/", "faculty": "Elektrotechnik"},
+        {"url": "https://stundenplan.ostfalia.de/v/", "faculty": "Versorgungstechnik", "shorthand_syntax": True},
+    ],
+    "current_sem": "ws24",
+    "timetable_blacklist": [],
+    "requests_per_second": 0,
+}
+
+
+class MemoryArchive:
+    """In-memory stand-in for a `snapshot.SnapshotArchive`, which serves `pages` to a `snapshot.ReplayAdapter` and
+    remembers the requested URLs"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def load(self, url):
+        self.requested.append(url)
+        if url not in self.pages:
+            return None
+        return {"status": 200, "content_type": "text/html; charset=utf-8"}, self.pages[url]
+
+    def __len__(self):
+        return len(self.pages)
+
+
+@pytest.fixture
+def overview_pages():
+    """Overview pages of the plans of `config`, by URL"""
+    return dict(_OVERVIEW_PAGES)
+
+
+@pytest.fixture
+def config():
+    """Config with two plans, whose overview pages are `overview_pages`"""
+    return copy.deepcopy(_CONFIG)
@@ -0,0 +1,247 @@
+import json
+
+import pytest
+
+from sked_parser import app, output, scraper
+from sked_parser.normalize import Rule, RuleSet
+from sked_parser.timetable import Timetable
+
+
+@pytest.fixture
+def pages(monkeypatch, overview_pages):
+    """Serve the overview pages from a dict and count how often each page is parsed"""
+    pages = overview_pages
+    parsed = []
+    parse_links = scraper.parse_links
+
+    def counting_parse_links(content, overview_url, faculty="", engine="bs4", extractor=None):
+        parsed.append(overview_url)
+        return parse_links(content, overview_url, faculty, engine, extractor)
+
+    monkeypatch.setattr(scraper, "fetch_chunks", lambda url, auth: iter([pages[url]]))
+    monkeypatch.setattr(scraper, "parse_links", counting_parse_links)
+    return pages, parsed
+
+
+def test_main_writes_sorted_tables(tmp_path, pages, config):
+    out_file = tmp_path / "timetables.json"
+    app.main(config, {}, [out_file])
+    tables = json.loads(out_file.read_text())
+    assert [table["id"] for table in tables] == ["e_eit_1_ws24", "v_bee_2_ws24"]
+    assert tables[1]["label"] == "BEE"
+
+
+def test_incremental_reuses_unchanged_plans(tmp_path, pages, config):
+    """Verify that only changed overview pages are parsed again and the output stays the same"""
+    content, parsed = pages
+    out_file = tmp_path / "timetables.json"
+    app.main(config, {}, [out_file], incremental=True)
+    full_output = out_file.read_text()
+    assert len(parsed) == 2
+
+    parsed.clear()
+    app.main(config, {}, [out_file], incremental=True)
+    assert parsed == []
+    assert out_file.read_text() == full_output
+
+    content["https://stundenplan.ostfalia.de/e/"] = b'<a href="semester/eit_3.html">Elektrotechnik - 3. Semester</a>'
+    app.main(config, {}, [out_file], incremental=True)
+    assert parsed == ["https://stundenplan.ostfalia.de/e/"]
+    assert "e_eit_3_ws24" in out_file.read_text()
+    assert "v_bee_2_ws24" in out_file.read_text()
+
+
+def test_incremental_reparses_on_config_change(tmp_path, pages, config):
+    _, parsed = pages
+    out_file = tmp_path / "timetables.json"
+    app.main(config, {}, [out_file], incremental=True)
+    parsed.clear()
+    app.main({**config, "current_sem": "ss25"}, {}, [out_file], incremental=True)
+    assert len(parsed) == 2
+
+
+def test_incremental_reparses_after_upgrade(tmp_path, pages, monkeypatch, config):
+    """Verify that entries stored by an older version are rebuilt, even if the overview pages didn't change"""
+    _, parsed = pages
+    out_file = tmp_path / "timetables.json"
+    app.main(config, {}, [out_file], incremental=True)
+    parsed.clear()
+    monkeypatch.setattr(app, "STATE_VERSION", app.STATE_VERSION + 1)
+    app.main(config, {}, [out_file], incremental=True)
+    assert len(parsed) == 2
+    parsed.clear()
+    monkeypatch.setattr(app, "ID_RULES", RuleSet(app.ID_RULES.rules + (Rule("eit_", "eit"),)))
+    app.main(config, {}, [out_file], incremental=True)
+    assert len(parsed) == 2
+
+
+def test_stream_engine_matches_default_engine(tmp_path, monkeypatch, pages, config):
+    content, _ = pages
+    monkeypatch.setattr(scraper, "fetch_chunks", lambda url, auth: iter([content[url][:20], content[url][20:]]))
+    app.main(config, {}, [tmp_path / "bs4.json"], incremental=True)
+    app.main({**config, "parse_engine": "stream"}, {}, [tmp_path / "stream.json"], incremental=True)
+    assert (tmp_path / "stream.json").read_text() == (tmp_path / "bs4.json").read_text()
+    assert load_state_fingerprints(tmp_path / "stream.state.json") == load_state_fingerprints(tmp_path / "bs4.state.json")
+
+
+def load_state_fingerprints(state_file):
+    return [plan["fingerprint"] for plan in json.loads(state_file.read_text())["plans"].values()]
+
+
+def timetable(path, sked_id):
+    return Timetable(path, "Label", "Elektrotechnik", "graphical", sked_id, 1, "Bachelor")
+
+
+def test_deduplicate_tables_removes_all_duplicated_urls():
+    """Verify that consecutive duplicates are all removed and the first entry is kept"""
+    tables = [timetable("a", "a1")] * 3 + [timetable("b", "b"), timetable("a", "a2")]
+    unique, collisions = app.deduplicate_tables(tables)
+    assert unique == [timetable("a", "a1"), timetable("b", "b")]
+    assert collisions == {}
+
+
+def test_deduplicate_tables_reports_colliding_ids():
+    tables = [timetable("a", "x"), timetable("b", "x"), timetable("c", "y")]
+    sources = {"a": ["https://stundenplan.ostfalia.de/e/"], "b": ["https://stundenplan.ostfalia.de/v/"]}
+    unique, collisions = app.deduplicate_tables(tables, sources)
+    assert len(unique) == 3
+    assert collisions == {"x": ["https://stundenplan.ostfalia.de/e/", "https://stundenplan.ostfalia.de/v/"]}
+
+
+def test_main_returns_metrics(tmp_path, pages, config, overview_pages):
+    metrics = app.main(config, {}, [tmp_path / "timetables.json"])
+    assert metrics.tables == 2
+    assert [plan.links for plan in metrics.plans] == [1, 1]
+    assert [plan.bytes for plan in metrics.plans] == [len(overview_pages[plan["url"]]) for plan in config["plans"]]
+    assert {"parse_links", "classify_links", "create_id", "optimize_label", "sort", "write"} <= set(metrics.helper_seconds)
+    assert json.loads(metrics.to_json())["plans"][1]["faculty"] == "Versorgungstechnik"
+    prometheus = metrics.to_prometheus()
+    assert "# TYPE sked_parser_plan_fetch_seconds gauge" in prometheus
+    assert 'sked_parser_plan_links{faculty="Elektrotechnik",url="https://stundenplan.ostfalia.de/e/"} 1.0' in prometheus
+    assert "sked_parser_tables 2.0" in prometheus
+
+
+def test_watch_republishes_only_on_change(tmp_path, pages, monkeypatch, config):
+    """Verify that watch mode only parses changed pages and only rewrites the output if the timetables changed"""
+    content, parsed = pages
+    writes = []
+    write_outputs = output.write_outputs
+    monkeypatch.setattr(output, "write_outputs", lambda tables, *args: writes.append(tables) or write_outputs(tables, *args))
+    out_file = tmp_path / "timetables.json"
+
+    app.watch(config, {}, [out_file], interval=0.01, jitter=0, cycles=3)
+    assert len(writes) == 1
+    assert len(parsed) == 2
+
+    # A page change that doesn't affect the timetables is parsed but not published
+    parsed.clear()
+    content["https://stundenplan.ostfalia.de/e/"] += b"<!-- changed -->"
+    app.watch(config, {}, [out_file], interval=0.01, jitter=0, cycles=2)
+    assert len(writes) == 1
+    assert parsed == ["https://stundenplan.ostfalia.de/e/", "https://stundenplan.ostfalia.de/v/"]
+
+    content["https://stundenplan.ostfalia.de/e/"] = b'<a href="semester/eit_3.html">Elektrotechnik - 3. Semester</a>'
+    app.watch(config, {}, [out_file], interval=0.01, jitter=0, cycles=2)
+    assert len(writes) == 2
+    assert "e_eit_3_ws24" in out_file.read_text()
+
+
+def test_watch_survives_parsing_errors(tmp_path, pages, monkeypatch, config):
+    """Verify that an unexpected error of one plan doesn't stop watch mode and the plan is polled again"""
+    parse_plan = app.parse_plan
+    calls = []
+
+    def failing_parse_plan(plan, *args):
+        calls.append(plan["url"])
+        if calls.count(plan["url"]) == 1 and plan["url"].endswith("/v/"):
+            raise Exception("Unbekannte Fakultät")
+        return parse_plan(plan, *args)
+
+    monkeypatch.setattr(app, "parse_plan", failing_parse_plan)
+    out_file = tmp_path / "timetables.json"
+    app.watch(config, {}, [out_file], interval=0.01, jitter=0, cycles=3)
+    assert calls.count("https://stundenplan.ostfalia.de/v/") >= 2
+    assert "v_bee_2_ws24" in out_file.read_text()
+
+
+def test_batch_fetches_and_parses_shared_pages_once(tmp_path, monkeypatch, pages, config, overview_pages):
+    """Verify that a batch run produces the same outputs as separate runs while fetching and parsing each page once"""
+    _, parsed = pages
+    archive = {**config, "current_sem": "ss24"}
+    app.main(config, {}, [tmp_path / "current.json"])
+    app.main(archive, {}, [tmp_path / "archive.json"])
+    fetched = []
+    fetch_chunks = scraper.fetch_chunks
+    monkeypatch.setattr(scraper, "fetch_chunks", lambda url, auth: fetched.append(url) or fetch_chunks(url, auth))
+    parsed.clear()
+
+    jobs = [(config, [tmp_path / "batch_current.json"]), (archive, [tmp_path / "batch_archive.json"])]
+    batch_metrics = app.run_batch(jobs, {}, processes=1)
+    assert sorted(fetched) == sorted(overview_pages)
+    assert sorted(parsed) == sorted(overview_pages)
+    assert (tmp_path / "batch_current.json").read_text() == (tmp_path / "current.json").read_text()
+    assert (tmp_path / "batch_archive.json").read_text() == (tmp_path / "archive.json").read_text()
+    assert [metrics.tables for metrics in batch_metrics] == [2, 2]
+    assert all(plan.links == 1 for metrics in batch_metrics for plan in metrics.plans)
+
+
+def test_batch_with_process_pool(tmp_path, pages, config):
+    app.main(config, {}, [tmp_path / "serial.json"])
+    app.run_batch([(config, [tmp_path / "pool.json"])], {}, processes=2)
+    assert (tmp_path / "pool.json").read_text() == (tmp_path / "serial.json").read_text()
+
+
+def test_unchanged_output_is_not_rewritten(tmp_path, pages, config):
+    content, _ = pages
+    out_file, changelog = tmp_path / "timetables.json", tmp_path / "changes.json"
+    app.main(config, {}, [out_file], changelog=changelog)
+    assert [table["id"] for table in json.loads(changelog.read_text())["added"]] == ["e_eit_1_ws24", "v_bee_2_ws24"]
+    changelog.unlink()
+    inode = out_file.stat().st_ino
+
+    app.main(config, {}, [out_file], changelog=changelog)
+    assert out_file.stat().st_ino == inode
+    assert not changelog.exists()
+
+    content["https://stundenplan.ostfalia.de/e/"] = (
+        b'<a href="semester/eit_1.html">Elektrotechnik Dual - 1. Semester</a><a href="semester/eit_3.html">Elektrotechnik - 3. Semester</a>'
+    )
+    content["https://stundenplan.ostfalia.de/v/"] = b""
+    app.main(config, {}, [out_file], changelog=changelog)
+    assert out_file.stat().st_ino != inode
+    changes = json.loads(changelog.read_text())
+    assert [table["id"] for table in changes["added"]] == ["e_eit_3_ws24"]
+    assert [table["id"] for table in changes["removed"]] == ["v_bee_2_ws24"]
+    assert changes["modified"] == [
+        {
+            "id": "e_eit_1_ws24",
+            "timetablePath": "https://stundenplan.ostfalia.de/e/semester/eit_1.html",
+            "changes": {"label": ["Elektrotechnik", "Elektrotechnik Dual"]},
+        }
+    ]
+
+
+def test_batch_does_not_rewrite_unchanged_output(tmp_path, pages, config):
+    out_file = tmp_path / "timetables.json"
+    app.run_batch([(config, [out_file])], {}, processes=1)
+    inode = out_file.stat().st_ino
+    app.run_batch([(config, [out_file])], {}, processes=1)
+    assert out_file.stat().st_ino == inode
+
+
+def test_state_is_written_atomically(tmp_path, monkeypatch, pages, config):
+    """Verify that an error while writing the state keeps the state of the last run"""
+    out_file = tmp_path / "timetables.json"
+    app.main(config, {}, [out_file], incremental=True)
+    state = app.state_file_for(out_file).read_text()
+
+    def failing_to_dict(table):
+        raise RuntimeError("encoding failed")
+
+    # Fails in the middle of encoding the state, after the fingerprints were already encoded
+    monkeypatch.setattr(Timetable, "to_dict", failing_to_dict)
+    with pytest.raises(RuntimeError):
+        app.main({**config, "current_sem": "ss25"}, {}, [out_file], incremental=True)
+    monkeypatch.undo()
+    assert app.state_file_for(out_file).read_text() == state
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["timetables.json", "timetables.state.json"]
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from sked_parser import scraper
+from sked_parser.cache import HttpCache
+
+URL = "https://stundenplan.ostfalia.de/e/"
+AUTH = {"user": "user", "pass": "pass"}
+
+
+class ConditionalAdapter(BaseAdapter):
+    """Fake transport that serves one page with an ETag and honors `If-None-Match`"""
+
+    def __init__(self, body, etag):
+        super().__init__()
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        resp = requests.Response()
+        resp.url = request.url
+        resp.request = request
+        resp.headers["ETag"] = self.etag
+        if request.headers.get("If-None-Match") == self.etag:
+            resp.status_code = 304
+            resp._content = b""
+        else:
+            resp.status_code = 200
+            resp._content = self.body
+        resp._content_consumed = True
+        return resp
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    adapter = ConditionalAdapter(b"<html>plans</html>", '"v1"')
+    session = requests.Session()
+    session.mount("https://", adapter)
+    monkeypatch.setattr(scraper, "session", session)
+    monkeypatch.setattr(scraper.rate_limiter, "rate", 0)
+    yield adapter
+    scraper.uninstall_cache()
+
+
+def test_cache_stores_validators(tmp_path):
+    """Verify that body and validators survive a new cache instance"""
+    HttpCache(tmp_path).put(URL, b"body", {"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+    entry = HttpCache(tmp_path).get(URL)
+    assert entry.body == b"body"
+    assert entry.conditional_headers() == {"If-None-Match": '"abc"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    assert HttpCache(tmp_path).get(URL + "other") is None
+
+
+def test_cache_evicts_to_max_size(tmp_path):
+    """Verify that the cache never grows beyond its max size"""
+    cache = HttpCache(tmp_path, max_size=10)
+    cache.put(URL + "a", b"123456", {})
+    cache.put(URL + "b", b"123456", {})
+    assert len(list(tmp_path.glob("*.body"))) == 1
+
+
+def test_fetch_uses_fresh_entry_without_request(tmp_path, adapter):
+    scraper.install_cache(tmp_path, ttl=600)
+    assert scraper.fetch(URL, AUTH) == b"<html>plans</html>"
+    assert scraper.fetch(URL, AUTH) == b"<html>plans</html>"
+    assert len(adapter.requests) == 1
+
+
+def test_fetch_revalidates_stale_entry(tmp_path, adapter):
+    scraper.install_cache(tmp_path, ttl=0)
+    scraper.fetch(URL, AUTH)
+    assert scraper.fetch(URL, AUTH) == b"<html>plans</html>"
+    assert len(adapter.requests) == 2
+    assert adapter.requests[1].headers["If-None-Match"] == '"v1"'
+
+
+def test_fetch_async_shares_the_cache(tmp_path, adapter):
+    scraper.install_cache(tmp_path, ttl=0)
+    scraper.fetch(URL, AUTH)
+    assert asyncio.run(scraper.fetch_async(URL, scraper.SessionClient(AUTH))) == b"<html>plans</html>"
+    assert len(adapter.requests) == 2
+    assert adapter.requests[1].headers["If-None-Match"] == '"v1"'
+
+
+def test_fetch_without_cache(adapter):
+    scraper.fetch(URL, AUTH)
+    scraper.fetch(URL, AUTH)
+    assert len(adapter.requests) == 2
+    assert "If-None-Match" not in adapter.requests[1].headers
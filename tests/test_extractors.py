@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+
+from sked_parser import extractors
+from sked_parser.extractors import LinkExtractor, extractor_for, register_extractor
+from sked_parser.scraper import iter_links, parse_links
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def test_extractor_is_selected_by_name_or_faculty():
+    assert isinstance(extractor_for("details"), extractors.DetailsExtractor)
+    assert isinstance(extractor_for(None, "Wirtschaft"), extractors.DetailsExtractor)
+    assert isinstance(extractor_for(None, "Informatik"), extractors.FipsExtractor)
+    assert type(extractor_for(None, "Elektrotechnik")) is LinkExtractor
+    with pytest.raises(ValueError):
+        extractor_for("unknown")
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml", "stream"])
+def test_configured_extractor_overrides_faculty(engine):
+    """A faculty with another name can use the layout of Wirtschaft by setting the extractor in the config"""
+    content = (FIXTURES / "wirtschaft.html").read_bytes()
+    expected = parse_links(content, "https://stundenplan.ostfalia.de/w/", "Wirtschaft", engine)
+    assert ("Betriebswirtschaftslehre 1. Semester", "https://stundenplan.ostfalia.de/w/studentenset/w-b-bwl-1.html") in expected
+    assert parse_links(content, "https://stundenplan.ostfalia.de/w/", "Weiterbildung", engine, "details") == expected
+    assert parse_links(content, "https://stundenplan.ostfalia.de/w/", "Weiterbildung", engine) != expected
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml", "stream"])
+def test_register_extractor(monkeypatch, engine):
+    monkeypatch.setattr(extractors, "extractors", dict(extractors.extractors))
+
+    @register_extractor("uppercase")
+    class UppercaseExtractor(LinkExtractor):
+        url_pattern = r"^https://stundenplan.ostfalia.de/e/semester/.+\.html$"
+
+        def describe(self, anchor):
+            return super().describe(anchor).upper()
+
+    content = (FIXTURES / "generic.html").read_bytes()
+    links = parse_links(content, "https://stundenplan.ostfalia.de/e/", "Elektrotechnik", engine, "uppercase")
+    assert links and all(desc == desc.upper() and "/e/semester/" in url for desc, url in links)
+    assert links == {
+        (desc.upper(), url)
+        for desc, url in parse_links(content, "https://stundenplan.ostfalia.de/e/", "Elektrotechnik", engine)
+        if "/e/semester/" in url
+    }
+
+
+DETAILS_LAYOUTS = {
+    "outside": (
+        '<p><a href="w/fdl.html">Fernstudium</a></p><details><summary>BWL</summary><a href="w/bwl_1.html">1. Semester</a></details>',
+        {
+            ("Fernstudium", "https://stundenplan.ostfalia.de/w/fdl.html"),
+            ("BWL 1. Semester", "https://stundenplan.ostfalia.de/w/bwl_1.html"),
+        },
+    ),
+    "list": (
+        '<details><summary>BWL</summary><ul><li><a href="w/bwl_1.html">1. Semester</a></li></ul></details>',
+        {("BWL 1. Semester", "https://stundenplan.ostfalia.de/w/bwl_1.html")},
+    ),
+    "nested": (
+        "<details><summary>Outer</summary><details><summary>Inner</summary>"
+        '<a href="w/inner_1.html">1. Semester</a></details><a href="w/outer_1.html">1. Semester</a></details>',
+        {
+            ("Inner 1. Semester", "https://stundenplan.ostfalia.de/w/inner_1.html"),
+            ("Outer 1. Semester", "https://stundenplan.ostfalia.de/w/outer_1.html"),
+        },
+    ),
+    "without_summary": (
+        '<details><summary>Outer</summary><details><p>Inner</p><a href="w/inner_1.html">1. Semester</a></details></details>',
+        {("1. Semester", "https://stundenplan.ostfalia.de/w/inner_1.html")},
+    ),
+}
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml", "stream"])
+@pytest.mark.parametrize("layout", DETAILS_LAYOUTS)
+def test_details_use_closest_block(layout, engine):
+    """Verify that the anchors are described by the summary of their closest details block in every engine"""
+    body, expected = DETAILS_LAYOUTS[layout]
+    content = f"<html><head></head><body>{body}</body></html>".encode()
+    assert parse_links(content, "https://stundenplan.ostfalia.de/", "Wirtschaft", engine) == expected
+    if engine == "stream":
+        chunks = [content[i : i + 7] for i in range(0, len(content), 7)]
+        assert set(iter_links(chunks, "https://stundenplan.ostfalia.de/", "Wirtschaft")) == expected
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml"])
+def test_details_summary_is_read_once_per_block(engine, monkeypatch):
+    layout = extractor_for("details")
+    prefixes = []
+    prefix = layout.prefix
+    monkeypatch.setattr(layout, "prefix", lambda details: prefixes.append(details.text) or prefix(details))
+    # Both blocks have the same markup, so they must not be confused
+    block = "<details><summary>BWL</summary>" + "".join(f'<a href="w/bwl_{i}.html">{i}. Semester</a>' for i in range(1, 4)) + "</details>"
+    content = f"<html><head></head><body>{block}<div>{block}</div></body></html>".encode()
+    links = parse_links(content, "https://stundenplan.ostfalia.de/", "Wirtschaft", engine)
+    assert links == {(f"BWL {i}. Semester", f"https://stundenplan.ostfalia.de/w/bwl_{i}.html") for i in range(1, 4)}
+    assert len(prefixes) == 2
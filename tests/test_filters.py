@@ -0,0 +1,84 @@
+import itertools
+
+import pytest
+
+from sked_parser.filters import BUILTIN_EXCLUSIONS, ExclusionRule, TimetableFilter
+from sked_parser.timetable import Timetable
+
+
+def timetable(path, label, faculty="Informatik"):
+    return Timetable(f"https://stundenplan.ostfalia.de/{path}", label, faculty, "graphical", "id", 1, "Bachelor")
+
+
+def original_is_valid_item(table, blacklist):
+    """The nested loop implementation the filter replaced"""
+    if table.faculty == "Elektrotechnik" and "block" in table.timetable_path.lower():
+        return False
+    if table.faculty == "Soziale Arbeit" and "fernstudiengang" in table.label.lower():
+        return False
+    for forbidden in blacklist:
+        if forbidden.lower() in table.timetable_path.lower() or forbidden.lower() in table.label.lower():
+            return False
+    return True
+
+
+def test_matches_original_blacklist_semantics():
+    blacklist = ["Klausur", "i/PRUEF", "Wahlpflicht (alt)", "a.b"]
+    table_filter = TimetableFilter.from_config({"timetable_blacklist": blacklist})
+    paths = ["e/block_1.html", "i/pruef/1.html", "s/fern.html", "v/axb.html", "e/eit_1.html"]
+    labels = ["Elektrotechnik", "Klausurenplan", "Fernstudiengang Soziale Arbeit", "wahlpflicht (ALT)", "A.B Test"]
+    faculties = ["Elektrotechnik", "Soziale Arbeit", "Informatik"]
+    for path, label, faculty in itertools.product(paths, labels, faculties):
+        table = timetable(path, label, faculty)
+        assert table_filter(table) == original_is_valid_item(table, blacklist), (path, label, faculty)
+
+
+def test_reports_matching_rule():
+    table_filter = TimetableFilter.from_config(
+        {
+            "timetable_blacklist": ["klausur"],
+            "timetable_exclusions": [{"pattern": r"_po\d+", "field": "path", "faculty": "Informatik", "regex": True}],
+        }
+    )
+    assert table_filter.match(timetable("e/block_1.html", "EIT", "Elektrotechnik")) == (BUILTIN_EXCLUSIONS[0], "path")
+    assert table_filter.match(timetable("i/x.html", "Klausuren")) == (ExclusionRule("klausur"), "label")
+    assert table_filter.match(timetable("i/inf_PO18.html", "Informatik"))[0].pattern == r"_po\d+"
+    assert table_filter.match(timetable("v/bee_po18.html", "BEE", "Versorgungstechnik")) is None
+    assert table_filter.match(timetable("e/block_1.html", "Block", "Informatik")) is None
+
+
+def test_large_blacklist():
+    blacklist = [f"plan_{i}.html" for i in range(500)]
+    table_filter = TimetableFilter.from_config({"timetable_blacklist": blacklist})
+    assert table_filter.match(timetable("i/plan_499.html", "Informatik"))[0].pattern == "plan_499.html"
+    assert table_filter(timetable("i/plan_500.html", "Informatik"))
+
+
+def test_unknown_field():
+    with pytest.raises(ValueError):
+        TimetableFilter([ExclusionRule("x", "description")])
+
+
+def test_regex_rules_with_groups():
+    table_filter = TimetableFilter.from_config(
+        {
+            "timetable_blacklist": ["klausur"],
+            "timetable_exclusions": [
+                {"pattern": r"(\d)\1", "field": "path", "regex": True},
+                {"pattern": r"(?x) alt \b", "field": "label", "regex": True},
+                {"pattern": r"(?P<po>po)\d+", "regex": True},
+            ],
+        }
+    )
+    assert table_filter.match(timetable("i/inf_11.html", "Informatik"))[0].pattern == r"(\d)\1"
+    assert table_filter(timetable("i/inf_12.html", "Informatik"))
+    assert table_filter.match(timetable("i/x.html", "Informatik alt"))[0].pattern == r"(?x) alt \b"
+    assert table_filter(timetable("i/x.html", "Informatik alternativ"))
+    # The leftmost match wins, no matter if the rule is part of the combined regex
+    assert table_filter.match(timetable("i/x.html", "PO18 Klausur"))[0].pattern == r"(?P<po>po)\d+"
+    assert table_filter.match(timetable("i/x.html", "Klausur PO18"))[0].pattern == "klausur"
+
+
+def test_invalid_regex_is_rejected_on_creation():
+    with pytest.raises(ValueError, match="Invalid regex"):
+        TimetableFilter.from_config({"timetable_exclusions": [{"pattern": "(unclosed", "regex": True}]})
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+import pytest
+
+# Budget for the cumulative import time of the console script in a fresh interpreter. It's generous to not fail on
+# slow machines, but importing requests, bs4 and lxml eagerly again takes several times as long.
+IMPORT_BUDGET_SECONDS = 0.25
+
+
+def import_times(module):
+    """Import `module` in a fresh interpreter and return the cumulative import time of each module in seconds"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_cli_startup_does_not_import_scraping_dependencies():
+    times = import_times("sked_parser.__main__")
+    assert not {"requests", "bs4", "lxml", "pkg_resources", "sked_parser.scraper", "sked_parser.app"} & times.keys()
+    assert times["sked_parser.__main__"] < IMPORT_BUDGET_SECONDS
+
+
+def test_batch_rejects_different_http_settings(tmp_path, monkeypatch, capsys):
+    from sked_parser import __main__
+
+    (tmp_path / "a.yaml").write_text("plans: []\nhttp:\n  retries: 1\n")
+    (tmp_path / "b.yaml").write_text("plans: []\n")
+    (tmp_path / "batch.yaml").write_text("jobs:\n  - {config: a.yaml, out_files: a.json}\n  - {config: b.yaml, out_files: b.json}\n")
+    monkeypatch.setattr(sys, "argv", ["sked-parser", "--batch", str(tmp_path / "batch.yaml")])
+    with pytest.raises(SystemExit):
+        __main__.main()
+    assert "different http settings" in capsys.readouterr().err
@@ -0,0 +1,45 @@
+import json
+from pathlib import Path
+
+from sked_parser.normalize import Rule, RuleSet
+from sked_parser.scraper import create_id, extract_semester, get_faculty_shortcode, optimize_label
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def test_ids_and_labels_match_examples():
+    """Verify that IDs and labels of the example resources stay the same as with the original replace chains"""
+    for row in json.loads((FIXTURES / "normalization_golden.json").read_text()):
+        desc, sked_path = row["desc"], row["sked_path"]
+        semester = extract_semester(desc, sked_path) or "Sonstige"
+        assert create_id(sked_path, get_faculty_shortcode(desc, sked_path), "ws20", semester, desc) == row["id"]
+        assert optimize_label(desc, False) == row["label"]
+        assert optimize_label(desc, True) == row["shorthand_label"]
+
+
+def test_literal_rules_keep_declaration_order():
+    """Verify that combined literal rules behave like consecutive str.replace calls"""
+    rules = RuleSet([Rule("I-"), Rule("I-M.Sc."), Rule("m_sc", "m"), Rule("b_sc")])
+    assert rules.apply("I-M.Sc. Informatik") == "M.Sc. Informatik"
+    assert rules.apply("e_m_sc_b_sc_1") == "e_m__1"
+
+
+def test_rules_from_config():
+    rules = RuleSet.from_config([{"pattern": "_po18"}, {"pattern": r"\d{4}", "replace": "x", "regex": True}])
+    assert rules.apply("bau_po18_2020") == "bau_x"
+    assert RuleSet.from_config(None).apply("bau_po18") == "bau_po18"
+
+
+def test_extra_rules_are_applied():
+    id_rules = RuleSet.from_config([{"pattern": "_po18"}])
+    assert create_id("e/semester/eit_po18.html", "e", "ws", 1, extra_rules=id_rules) == "e_eit_1_ws"
+    label_rules = RuleSet.from_config([{"pattern": r"\s*\(PO ?\d+\)", "regex": True}])
+    assert optimize_label("Elektrotechnik (PO 18) - 1. Semester", False, label_rules) == "Elektrotechnik"
+
+
+def test_literal_rules_rescan_joined_text():
+    """Verify that text joined by a removal is matched by later rules, like the original replace chains"""
+    assert create_id("e/b_semester_sc.html", "e", "ws24", "Sonstige") == "e_ws24"
+    assert create_id("e/m_bachelorsc.html", "e", "ws24", "Sonstige") == "e_m_ws24"
+    assert optimize_label("BacheS-lor BWL", False) == "BWL"
+    assert RuleSet([Rule("S-"), Rule("Bachelor")]).apply("BacheS-lor BWL") == " BWL"
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from sked_parser import output
+
+TABLES = [
+    {
+        "timetablePath": "https://stundenplan.ostfalia.de/e/semester/eit_1.html",
+        "label": "Elektrotechnik",
+        "id": "e_eit_1_ws",
+        "semester": 1,
+    },
+    {
+        "timetablePath": "https://stundenplan.ostfalia.de/s/soa.html",
+        "label": "Soziale Arbeit – Präsenz",
+        "id": "s_soa_ws",
+        "semester": "WPF",
+    },
+]
+
+
+def test_json_output_matches_json_dump(tmp_path):
+    """Verify that the default output is byte-identical to json.dump with indent=2"""
+    out_file = tmp_path / "timetables.json"
+    output.write_outputs(TABLES, [out_file])
+    assert out_file.read_text(encoding="utf-8") == json.dumps(TABLES, indent=2, ensure_ascii=False) + "\n"
+    assert list(tmp_path.iterdir()) == [out_file]
+
+
+def test_compact_and_ndjson_output(tmp_path):
+    output.write_outputs(TABLES, [tmp_path / "compact.json", tmp_path / "timetables.ndjson"], compact=True)
+    compact = (tmp_path / "compact.json").read_text(encoding="utf-8")
+    assert "\n" not in compact.rstrip("\n")
+    assert json.loads(compact) == TABLES
+    lines = (tmp_path / "timetables.ndjson").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == TABLES
+
+
+def test_each_format_is_encoded_once(tmp_path, monkeypatch):
+    calls = []
+
+    def counting_writer(tables, compact):
+        calls.append(len(tables))
+        yield b"encoded"
+
+    monkeypatch.setitem(output.writers, "counting", counting_writer)
+    out_files = [tmp_path / "a.json", tmp_path / "b.json", tmp_path / "c.json"]
+    output.write_outputs(TABLES, out_files, output_format="counting")
+    assert calls == [2]
+    assert all(out_file.read_bytes() == b"encoded" for out_file in out_files)
+
+
+def test_failed_write_keeps_previous_file(tmp_path, monkeypatch):
+    """Verify that an error while encoding neither touches the existing output nor leaves temporary files behind"""
+
+    def failing_writer(tables, compact):
+        yield b"half of the"
+        raise RuntimeError("encoding failed")
+
+    monkeypatch.setitem(output.writers, "failing", failing_writer)
+    out_file = tmp_path / "timetables.json"
+    out_file.write_text("previous")
+    with pytest.raises(RuntimeError):
+        output.write_outputs(TABLES, [out_file], output_format="failing")
+    assert out_file.read_text() == "previous"
+    assert list(tmp_path.iterdir()) == [out_file]
+
+
+def test_msgpack_output(tmp_path):
+    msgpack = pytest.importorskip("msgpack")
+    output.write_outputs(TABLES, [tmp_path / "timetables.msgpack"])
+    assert msgpack.unpackb((tmp_path / "timetables.msgpack").read_bytes()) == TABLES
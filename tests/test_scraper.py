@@ -1,10 +1,27 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from time import monotonic
+
+import pytest
+import requests
+
+from sked_parser import scraper
 from sked_parser.scraper import (
+    RateLimiter,
+    classify_links,
     create_id,
     extract_semester,
+    get_faculty_shortcode,
     optimize_label,
     guess_degree,
+    iter_links,
+    parse_links,
 )
 
+FIXTURES = Path(__file__).parent / "fixtures"
+
 
 def test_extract_semester_normal():
     """Test normal/default string"""
@@ -160,3 +177,264 @@ def test_is_master():
         return f"e/semester/{part_str}.html"
 
     assert guess_degree("", sked_path("b_stgrp_ma_glob_1")) == "Master"
+
+
+def test_rate_limiter_paces_per_host():
+    """Verify that requests to one host are paced while different hosts don't wait for each other"""
+    limiter = RateLimiter(rate=20, burst=1)
+    start = monotonic()
+    for _ in range(3):
+        limiter.acquire("https://stundenplan.ostfalia.de/e/")
+    assert monotonic() - start >= 0.09
+    start = monotonic()
+    limiter.acquire("https://intranet-i.ostfalia.de/fips/stundenplan/")
+    assert monotonic() - start < 0.05
+
+
+@pytest.mark.parametrize(
+    "fixture,overview_url,faculty",
+    [
+        ("informatik.html", "https://stundenplan.ostfalia.de/i/Semester/Semester-Liste/", "Informatik"),
+        ("wirtschaft.html", "https://stundenplan.ostfalia.de/w/", "Wirtschaft"),
+        ("recht.html", "https://stundenplan.ostfalia.de/r/", "Recht"),
+        ("generic.html", "https://stundenplan.ostfalia.de/e/", "Elektrotechnik"),
+    ],
+)
+def test_parse_links_engine_parity(fixture, overview_url, faculty):
+    """Verify that the lxml engine extracts exactly the same links as the BeautifulSoup engine"""
+    content = (FIXTURES / fixture).read_bytes()
+    expected = parse_links(content, overview_url, faculty, engine="bs4")
+    assert len(expected) > 0
+    assert parse_links(content, overview_url, faculty, engine="lxml") == expected
+    assert parse_links(content, overview_url, faculty, engine="stream") == expected
+    # Anchors that are split across several chunks must be found as well
+    chunks = [content[i : i + 7] for i in range(0, len(content), 7)]
+    assert set(iter_links(chunks, overview_url, faculty)) == expected
+
+
+def test_parse_links_engine_parity_without_declared_encoding():
+    content = '<ul><li><a href="semester/bau_1.html">Bauingenieurwesen für Anfänger - 1. Semester</a></li></ul>'
+    for encoding in ["utf-8", "windows-1252", "latin-1"]:
+        expected = parse_links(content.encode(encoding), "https://stundenplan.ostfalia.de/b/", engine="bs4")
+        assert parse_links(content.encode(encoding), "https://stundenplan.ostfalia.de/b/", engine="lxml") == expected
+    # An encoding declaration after the first 2 KiB is ignored by every engine
+    late = f'<html><head><!-- {"x" * 3000} --><meta charset="iso-8859-1"></head><body>{content}</body></html>'.encode("latin-1")
+    expected = parse_links(late, "https://stundenplan.ostfalia.de/b/", engine="bs4")
+    assert parse_links(late, "https://stundenplan.ostfalia.de/b/", engine="lxml") == expected
+    assert parse_links(late, "https://stundenplan.ostfalia.de/b/", engine="stream") == expected
+    # The streaming engine can't guess the encoding upfront and always falls back to UTF-8
+    expected = parse_links(content.encode("utf-8"), "https://stundenplan.ostfalia.de/b/", engine="bs4")
+    assert parse_links(content.encode("utf-8"), "https://stundenplan.ostfalia.de/b/", engine="stream") == expected
+
+
+def test_iter_links_yields_before_body_is_complete():
+    """Verify that the streaming parser emits anchors while the rest of the page is still being transferred"""
+    items = "".join(f'<li><a href="semester/eit_{i}.html">EIT {i}</a></li>' for i in range(100))
+    # The end of the head stops looking for an encoding declaration, so parsing starts right away
+    content = f"<html><head><title>E</title></head><body><ul>{items}</ul></body></html>".encode()
+    consumed = []
+
+    def chunks():
+        for i in range(0, len(content), 64):
+            consumed.append(i)
+            yield content[i : i + 64]
+
+    links = iter_links(chunks(), "https://stundenplan.ostfalia.de/e/")
+    assert next(links) == ("EIT 0", "https://stundenplan.ostfalia.de/e/semester/eit_0.html")
+    assert len(consumed) < 5
+    assert len(list(links)) == 99
+
+
+def test_classify_links_matches_single_helpers():
+    """Verify that the batch classification returns the same columns as the single link helpers"""
+    descs = (Path(__file__).parent.parent / "resources" / "example_desc.txt").read_text().splitlines()
+    paths = (Path(__file__).parent.parent / "resources" / "example_urls.txt").read_text().splitlines()
+    result = classify_links(zip(descs, paths))
+    assert result.faculty_short == [get_faculty_shortcode(d, p) for d, p in zip(descs, paths)]
+    assert result.degree == [guess_degree(d, p) for d, p in zip(descs, paths)]
+    assert result.semester == [extract_semester(d, p) for d, p in zip(descs, paths)]
+
+
+def test_classify_links_without_links():
+    assert classify_links([]) == ([], [], [])
+
+
+@pytest.fixture
+def flaky_server(monkeypatch):
+    """Local HTTP server that answers with 503 for the first request of each path and 200 afterwards"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append((self.path, self.headers.get("Authorization")))
+            if self.path == "/missing":
+                self.send_response(404)
+            elif [path for path, _ in requests_seen].count(self.path) == 1:
+                self.send_response(503)
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", "4")
+            self.end_headers()
+            self.wfile.write(b"page")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(scraper, "session", requests.Session())
+    monkeypatch.setattr(scraper, "cache", None)
+    monkeypatch.setattr(scraper.rate_limiter, "rate", 0)
+    scraper.configure_session({"user": "user", "pass": "pass"}, backoff_factor=0.01)
+    yield f"http://127.0.0.1:{server.server_address[1]}", requests_seen
+    server.shutdown()
+    scraper.configure_session()
+
+
+def test_fetch_retries_server_errors(flaky_server):
+    """Verify that a transient 503 is retried and the auth of the session is used"""
+    base_url, requests_seen = flaky_server
+    assert scraper.fetch(f"{base_url}/e/") == b"page"
+    assert len(requests_seen) == 2
+    assert requests_seen[1][1] == "Basic dXNlcjpwYXNz"
+
+
+def test_fetch_raises_for_error_status(flaky_server):
+    base_url, _ = flaky_server
+    with pytest.raises(requests.HTTPError):
+        scraper.fetch(f"{base_url}/missing")
+
+
+def test_configure_session_closes_previous_adapter(monkeypatch):
+    monkeypatch.setattr(scraper, "session", requests.Session())
+    try:
+        scraper.configure_session(backoff_factor=0.25)
+        previous = scraper.session.get_adapter("https://")
+        assert previous.max_retries.backoff_jitter == 0.25
+        closed = []
+        monkeypatch.setattr(previous, "close", lambda: closed.append(previous))
+        scraper.configure_session()
+        assert closed == [previous]
+        assert scraper.session.get_adapter("https://") is not previous
+    finally:
+        scraper.configure_session()
+
+
+@pytest.fixture
+def overview_server(monkeypatch):
+    """Local HTTP server that serves the overview page fixtures, e.g. /generic.html"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = FIXTURES / self.path.lstrip("/")
+            if not path.is_file():
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = path.read_bytes()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(scraper, "session", requests.Session())
+    monkeypatch.setattr(scraper, "cache", None)
+    monkeypatch.setattr(scraper.rate_limiter, "rate", 0)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_sync_and_async_get_links(overview_server):
+    plans = [
+        {"url": f"{overview_server}/{name}.html", "faculty": faculty}
+        for name, faculty in [("generic", "Elektrotechnik"), ("recht", "Recht")]
+    ]
+    expected = [
+        parse_links((FIXTURES / f"{name}.html").read_bytes(), plan["url"], plan["faculty"])
+        for name, plan in zip(["generic", "recht"], plans)
+    ]
+    assert [scraper.get_links(plan["url"], None, plan["faculty"]) for plan in plans] == expected
+    assert asyncio.run(scraper.get_all_links_async(plans)) == expected
+    with pytest.raises(requests.HTTPError):
+        scraper.get_links(f"{overview_server}/missing.html", None)
+
+
+def test_sync_get_links_streams(overview_server, monkeypatch):
+    """Verify that the stream engine extracts the links from the chunks instead of the buffered body"""
+    monkeypatch.setattr(scraper, "fetch", None)
+    url = f"{overview_server}/recht.html"
+    expected = parse_links((FIXTURES / "recht.html").read_bytes(), url, "Recht")
+    assert scraper.get_links(url, None, "Recht", "stream") == expected
+
+
+def test_get_all_links_async_limits_concurrency(monkeypatch):
+    """Verify that an injected client is used for all plans and at most `concurrency` pages are fetched at once"""
+    monkeypatch.setattr(scraper, "cache", None)
+    monkeypatch.setattr(scraper.rate_limiter, "rate", 0)
+    content = (FIXTURES / "generic.html").read_bytes()
+    in_flight = []
+
+    class FakeResponse:
+        status_code = 200
+        headers = {}
+
+        def __init__(self, content):
+            self.content = content
+
+        def raise_for_status(self):
+            pass
+
+    class FakeClient:
+        def __init__(self):
+            self.active = 0
+
+        async def get(self, url, headers=None):
+            self.active += 1
+            in_flight.append(self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return FakeResponse(content)
+
+    plans = [{"url": f"https://stundenplan.ostfalia.de/e/{i}/", "faculty": "Elektrotechnik"} for i in range(6)]
+    links = asyncio.run(scraper.get_all_links_async(plans, FakeClient(), concurrency=2))
+    assert len(links) == 6 and all(len(plan_links) > 0 for plan_links in links)
+    assert len(in_flight) == 6 and max(in_flight) == 2
+
+
+def test_iter_links_finds_encoding_declaration_after_first_chunk():
+    content = (
+        '<html><head><meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1"></head>'
+        '<body><a href="w/fdl.html">Führung</a></body></html>'
+    ).encode("latin-1")
+    chunks = [content[:20], content[20:]]
+    assert set(iter_links(chunks, "https://stundenplan.ostfalia.de/")) == {("Führung", "https://stundenplan.ostfalia.de/w/fdl.html")}
+    assert parse_links(content, "https://stundenplan.ostfalia.de/") == set(iter_links(chunks, "https://stundenplan.ostfalia.de/"))
+
+
+def test_iter_links_drops_finished_elements():
+    """Verify that the tree of the stream engine stays small for layouts without list items"""
+    blocks = "".join(f'<details><summary>Kurs {i}</summary><p><a href="w/k_{i}.html">1. Semester</a></p></details>' for i in range(200))
+    content = f"<html><head></head><body>{blocks}</body></html>".encode()
+    sizes = []
+    describe = scraper.extractor_for("details").describe
+
+    def measuring_describe(anchor):
+        sizes.append(sum(1 for _ in anchor.element.getroottree().iter()))
+        return describe(anchor)
+
+    layout = scraper.extractor_for("details")
+    layout.describe = measuring_describe
+    try:
+        links = set(
+            iter_links([content[i : i + 100] for i in range(0, len(content), 100)], "https://stundenplan.ostfalia.de/", "Wirtschaft")
+        )
+    finally:
+        del layout.describe
+    assert ("Kurs 199 1. Semester", "https://stundenplan.ostfalia.de/w/k_199.html") in links
+    assert len(links) == 200
+    assert max(sizes) < 20
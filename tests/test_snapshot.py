@@ -0,0 +1,86 @@
+import gzip
+import json
+import sys
+
+import pytest
+import requests
+
+from sked_parser import __main__, app, scraper, snapshot
+
+from .conftest import MemoryArchive
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = requests.Session()
+    monkeypatch.setattr(scraper, "session", session)
+    monkeypatch.setattr(scraper, "cache", None)
+    return session
+
+
+def test_record_and_replay(tmp_path, session, config, overview_pages):
+    # The network is stood in for by replaying the pages from memory
+    server = MemoryArchive(overview_pages)
+    session.mount("https://", snapshot.ReplayAdapter(server))
+    archive = snapshot.record(session, tmp_path / "archive")
+    app.main(config, None, [tmp_path / "live.json"])
+    assert sorted(server.requested) == sorted(overview_pages)
+    assert not (tmp_path / "archive" / "manifest.json").exists()
+    archive.save()
+
+    manifest = json.loads((tmp_path / "archive" / "manifest.json").read_text())
+    for url, entry in manifest["pages"].items():
+        assert gzip.decompress((tmp_path / "archive" / entry["file"]).read_bytes()) == overview_pages[url]
+        assert entry["status"] == 200 and entry["size"] == len(overview_pages[url])
+
+    # Replay on a fresh session, no request may reach the network
+    network = MemoryArchive({})
+    replay_session = requests.Session()
+    replay_session.mount("https://", snapshot.ReplayAdapter(network))
+    scraper.session = replay_session
+    snapshot.replay(replay_session, tmp_path / "archive")
+    app.main(config, None, [tmp_path / "replayed.json"])
+    assert (tmp_path / "replayed.json").read_text() == (tmp_path / "live.json").read_text()
+    assert scraper.get_links("https://stundenplan.ostfalia.de/e/", None, "Elektrotechnik") == {
+        ("Elektrotechnik - 1. Semester", "https://stundenplan.ostfalia.de/e/semester/eit_1.html")
+    }
+    with pytest.raises(requests.HTTPError):
+        scraper.fetch("https://stundenplan.ostfalia.de/i/")
+    assert network.requested == []
+
+
+def test_replay_from_command_line_without_credentials(tmp_path, session, monkeypatch, config, overview_pages):
+    archive = snapshot.SnapshotArchive(tmp_path / "archive")
+    for url, body in overview_pages.items():
+        archive.store(url, body, content_type="text/html")
+    archive.save()
+    # An `http` key whose settings are all commented out is loaded as None
+    (tmp_path / "config.yaml").write_text(json.dumps({**config, "http": None}))
+    monkeypatch.delenv("OSTFALIA_USER", raising=False)
+    monkeypatch.delenv("OSTFALIA_PASS", raising=False)
+    argv = ["sked-parser", "-c", str(tmp_path / "config.yaml"), "-s", str(tmp_path / "missing.yaml")]
+    argv += ["-o", str(tmp_path / "timetables.json"), "--replay", str(tmp_path / "archive")]
+    monkeypatch.setattr(sys, "argv", argv)
+    try:
+        __main__.main()
+    finally:
+        scraper.configure_session()
+    tables = json.loads((tmp_path / "timetables.json").read_text())
+    assert [table["id"] for table in tables] == ["e_eit_1_ws24", "v_bee_2_ws24"]
+
+
+def test_replay_requires_manifest(tmp_path, session):
+    with pytest.raises(FileNotFoundError):
+        snapshot.replay(session, tmp_path)
+
+
+def test_manifest_is_saved_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SAVE_EVERY", 2)
+    archive = snapshot.SnapshotArchive(tmp_path)
+    archive.store("https://stundenplan.ostfalia.de/a/", b"a")
+    assert not (tmp_path / "manifest.json").exists()
+    archive.store("https://stundenplan.ostfalia.de/b/", b"b")
+    archive.store("https://stundenplan.ostfalia.de/c/", b"c")
+    assert len(snapshot.SnapshotArchive(tmp_path)) == 2
+    archive.save()
+    assert len(snapshot.SnapshotArchive(tmp_path)) == 3
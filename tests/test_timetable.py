@@ -0,0 +1,40 @@
+import json
+import pickle
+
+from sked_parser import output
+from sked_parser.timetable import Timetable
+
+TABLE = {
+    "timetablePath": "https://stundenplan.ostfalia.de/e/semester/EIT_1.html",
+    "label": "Elektrotechnik",
+    "faculty": "Elektrotechnik",
+    "type": "graphical",
+    "id": "e_eit_1_ws",
+    "semester": 1,
+    "degree": "Bachelor",
+}
+
+
+def test_serializes_to_the_same_json_as_a_dict(tmp_path):
+    timetable = Timetable.from_dict(TABLE)
+    assert timetable.to_dict() == TABLE
+    assert list(timetable.to_dict()) == list(TABLE)
+    output.write_outputs([timetable], [tmp_path / "record.json", tmp_path / "record.ndjson"])
+    output.write_outputs([TABLE], [tmp_path / "dict.json", tmp_path / "dict.ndjson"])
+    for suffix in [".json", ".ndjson"]:
+        assert (tmp_path / f"record{suffix}").read_bytes() == (tmp_path / f"dict{suffix}").read_bytes()
+
+
+def test_precomputed_fields():
+    timetable = Timetable.from_dict(TABLE)
+    assert timetable.path_lower == "https://stundenplan.ostfalia.de/e/semester/eit_1.html"
+    assert timetable.label_lower == "elektrotechnik"
+    assert timetable.sort_key == ("Elektrotechnik", "Bachelor", "1", "Elektrotechnik", "e_eit_1_ws")
+    assert not hasattr(timetable, "__dict__")
+
+
+def test_survives_pickle_and_json_state():
+    """Timetables are sent to worker processes and stored in the state file of incremental runs"""
+    timetable = Timetable.from_dict(TABLE)
+    assert pickle.loads(pickle.dumps(timetable)) == timetable
+    assert Timetable.from_dict(json.loads(json.dumps(timetable, default=Timetable.to_dict))) == timetable